@@ -0,0 +1,157 @@
+import collections
+import queue
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from tag_batch import TagReadBatch
+
+OVERFLOW_POLICIES = ('block', 'drop-oldest', 'coalesce')
+
+class BatchRing:
+    """Bounded FIFO of TagReadBatch objects, sized in reads rather than batches.
+
+    The producer puts whole batches; the consumer takes everything queued in
+    one call. When a put would exceed `capacity` reads the overflow policy
+    decides what happens:
+
+      block        wait for the consumer to make room
+      drop-oldest  discard the oldest queued batches until the new one fits
+      coalesce     fold the oldest queued batches, then the new one, into a
+                   head batch holding the latest read per (reader, EPC,
+                   antenna); if more distinct tags are queued than fit,
+                   drop that head batch instead
+
+    A single batch larger than the whole capacity is always accepted into an
+    empty ring so progress is never blocked. Coalescing folds each read at
+    most once, so a put costs time proportional to its own batch, not to
+    the capacity.
+    """
+
+    def __init__(self, capacity: int = 100_000, policy: str = 'block'):
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._batches = collections.deque()  # (enqueue time, batch)
+        self._closed = False
+        self._head: Optional[TagReadBatch] = None  # Queued batch that coalesce folds reads into
+        self._head_rows: Dict[Tuple[int, int, int], int] = {}  # (reader, EPC, antenna) -> row in _head
+        self.configure(capacity, policy)
+        self.size = 0              # Reads currently queued
+        self.high_water = 0        # Most reads ever queued at once
+        self.dropped = 0           # Reads discarded to make room
+        self.coalesced = 0         # Reads folded away by coalesce
+        self.blocked_s = 0.0       # Total time producers spent waiting for room
+        self.lag_s = 0.0           # Age of the oldest batch at the last get
+        self.max_lag_s = 0.0
+
+    def configure(self, capacity: int, policy: str):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if capacity < 1:
+            raise ValueError("Capacity must be at least one read")
+        self.capacity = capacity
+        self.policy = policy
+
+    def __len__(self) -> int:
+        return self.size
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def put(self, batch: TagReadBatch):
+        """Queue a batch, applying the overflow policy if the ring is full."""
+        count = len(batch)
+        with self._lock:
+            if self.size and self.size + count > self.capacity:
+                if self.policy == 'block':
+                    start = time.monotonic()
+                    while self.size and self.size + count > self.capacity:
+                        self._not_full.wait()
+                    self.blocked_s += time.monotonic() - start
+                elif self.policy == 'coalesce':
+                    self._coalesce(batch)
+                    batch = None
+                else:
+                    while self._batches and self.size + count > self.capacity:
+                        self._drop_oldest()
+            if batch is not None:
+                self._batches.append((time.monotonic(), batch))
+                self.size += count
+            if self.size > self.high_water:
+                self.high_water = self.size
+            self._not_empty.notify()
+
+    def get(self, timeout: float = None) -> TagReadBatch:
+        """Take every queued read as one batch; raises queue.Empty after `timeout`."""
+        with self._lock:
+            if not self._not_empty.wait_for(lambda: self._batches or self._closed, timeout) or not self._batches:
+                raise queue.Empty
+            enqueued, merged = self._batches.popleft()
+            self._head = None  # Handed to the consumer; coalesce starts a new one
+            self._head_rows = {}
+            while self._batches:
+                merged.extend(self._batches.popleft()[1])
+            self.size = 0
+            self.lag_s = time.monotonic() - enqueued
+            if self.lag_s > self.max_lag_s:
+                self.max_lag_s = self.lag_s
+            self._not_full.notify_all()
+            return merged
+
+    def close(self):
+        """No more puts are coming; wake the consumer and stop get() from blocking."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+
+    def metrics(self) -> Dict:
+        """Point-in-time backpressure counters for the stats line."""
+        with self._lock:
+            return {'depth': self.size, 'high_water': self.high_water, 'dropped': self.dropped,
+                    'coalesced': self.coalesced, 'blocked_s': self.blocked_s,
+                    'lag_ms': self.lag_s * 1000, 'max_lag_ms': self.max_lag_s * 1000}
+
+    def _drop_oldest(self):
+        _, batch = self._batches.popleft()
+        if batch is self._head:
+            self._head = None
+            self._head_rows = {}
+        self.size -= len(batch)
+        self.dropped += len(batch)
+
+    def _fold(self, batch: TagReadBatch, queued: bool):
+        """Fold a batch into the head batch; `queued` if its reads are already counted in size."""
+        added = self._head.fold(batch, self._head_rows)
+        self.coalesced += len(batch) - added
+        self.size += added - len(batch) if queued else added
+
+    def _coalesce(self, batch: TagReadBatch):
+        """Make room for `batch` by folding queued reads, oldest first, into the head batch.
+
+        Reads stay in arrival order: the head holds the oldest reads, and the
+        new batch is folded in only once every other queued batch has been.
+        """
+        if self._head is None:
+            enqueued, oldest = self._batches.popleft()
+            self._head = TagReadBatch(batch.epc_table)
+            self._head_rows = {}
+            self._batches.appendleft((enqueued, self._head))
+            self._fold(oldest, queued=True)
+        while self.size + len(batch) > self.capacity and len(self._batches) > 1:
+            _, oldest = self._batches[1]
+            del self._batches[1]
+            self._fold(oldest, queued=True)
+        if self.size + len(batch) <= self.capacity:
+            self._batches.append((time.monotonic(), batch))
+            self.size += len(batch)
+            return
+        # Only the head is left; folding the new reads in adds a row per tag it does not hold yet
+        new_tags = {key for key in zip(batch.reader_id, batch.epc_id, batch.antenna) if key not in self._head_rows}
+        if self.size + len(new_tags) <= self.capacity:
+            self._fold(batch, queued=False)
+            return
+        # More distinct tags than the ring holds: fall back to dropping the oldest reads
+        self._drop_oldest()
+        self._batches.append((time.monotonic(), batch))
+        self.size += len(batch)
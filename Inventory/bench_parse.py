@@ -0,0 +1,109 @@
+import argparse
+import datetime
+import struct
+import time
+from typing import Dict, List
+
+from llrp_simulator import DEFAULT_CAPTURE, load_capture
+from rfid_reader import build_tag_report_data, parse_ro_access_report
+
+def build_reports(reads: List[Dict], tags_per_report: int) -> List[bytes]:
+    """Group reads into RO_ACCESS_REPORT bodies as the reader would send them."""
+    reports = []
+    for i in range(0, len(reads), tags_per_report):
+        reports.append(b''.join(
+            build_tag_report_data(r['epc'], r['antenna'], r['rssi'], r['timestamp_us'],
+                                  r['channel_index'], r['phase_angle'], r['doppler_frequency'])
+            for r in reads[i:i + tags_per_report]
+        ))
+    return reports
+
+def build_legacy_reports(reads: List[Dict], tags_per_report: int) -> List[bytes]:
+    """Same reads in the all-TLV layout the previous parser expected."""
+    def tlv(param_type, payload):
+        return struct.pack('>HH', param_type, 4 + len(payload)) + payload
+
+    reports = []
+    for i in range(0, len(reads), tags_per_report):
+        body = b''
+        for r in reads[i:i + tags_per_report]:
+            epc = bytes.fromhex(r['epc'])
+            body += tlv(1024, b''.join([
+                tlv(1025, struct.pack('>H', len(epc)) + epc),
+                tlv(1026, struct.pack('>H', r['antenna'])),
+                tlv(1027, struct.pack('>h', r['rssi'])),
+                tlv(1028, struct.pack('>Q', r['timestamp_us'])),
+                tlv(1030, struct.pack('>H', r['phase_angle'])),
+                tlv(1031, struct.pack('>H', r['channel_index'])),
+                tlv(1032, struct.pack('>h', r['doppler_frequency'])),
+            ]))
+        reports.append(body)
+    return reports
+
+def legacy_parse_ro_access_report(data: bytes) -> List[Dict]:
+    """The baseline per-slice struct.unpack / if-elif parser with all of its print calls removed."""
+    reads = []
+    pos = 0
+    while pos < len(data):
+        param_type = struct.unpack('>H', data[pos:pos+2])[0]
+        param_length = struct.unpack('>H', data[pos+2:pos+4])[0]
+        if param_type == 1024:
+            param_data = data[pos+4:pos+param_length]
+            param_pos = 0
+            tag_read = {'timestamp': None, 'antenna': None, 'rssi': None, 'epc': None,
+                        'phase_angle': None, 'channel_index': None, 'doppler_frequency': None}
+            while param_pos < len(param_data):
+                sub_type = struct.unpack('>H', param_data[param_pos:param_pos+2])[0]
+                sub_length = struct.unpack('>H', param_data[param_pos+2:param_pos+4])[0]
+                if sub_type == 1025:
+                    epc_length = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
+                    tag_read['epc'] = param_data[param_pos+6:param_pos+6+epc_length].hex()
+                elif sub_type == 1026:
+                    tag_read['antenna'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
+                elif sub_type == 1027:
+                    tag_read['rssi'] = struct.unpack('>h', param_data[param_pos+4:param_pos+6])[0]
+                elif sub_type == 1028:
+                    timestamp_us = struct.unpack('>Q', param_data[param_pos+4:param_pos+12])[0]
+                    tag_read['timestamp'] = datetime.datetime.utcfromtimestamp(timestamp_us / 1_000_000).isoformat()
+                elif sub_type == 1030:
+                    tag_read['phase_angle'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
+                elif sub_type == 1031:
+                    tag_read['channel_index'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
+                elif sub_type == 1032:
+                    tag_read['doppler_frequency'] = struct.unpack('>h', param_data[param_pos+4:param_pos+6])[0]
+                param_pos += sub_length
+            if tag_read['epc']:
+                reads.append(tag_read)
+        pos += param_length
+    return reads
+
+def time_parser(parse, reports: List[bytes], repeat: int) -> float:
+    """Return reads per second for the best of `repeat` passes over `reports`."""
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        for report in reports:
+            count += len(parse(report))
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for RO_ACCESS_REPORT parsing")
+    parser.add_argument('--capture', default=DEFAULT_CAPTURE, help='Capture CSV to synthesize reports from')
+    parser.add_argument('--tags-per-report', type=int, default=20, help='TagReportData parameters per report')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes (best is reported)')
+    parser.add_argument('--scale', type=int, default=20, help='Replicate the capture this many times')
+    args = parser.parse_args()
+
+    reads = load_capture(args.capture) * args.scale
+    print(f"Loaded {len(reads)} reads from {args.capture}, {args.tags_per_report} tags per report")
+
+    before = time_parser(legacy_parse_ro_access_report, build_legacy_reports(reads, args.tags_per_report), args.repeat)
+    after = time_parser(parse_ro_access_report, build_reports(reads, args.tags_per_report), args.repeat)
+    print(f"before: {before:12,.0f} reads/s")
+    print(f"after:  {after:12,.0f} reads/s  ({after / before:.2f}x)")
+
+if __name__ == '__main__':
+    main()
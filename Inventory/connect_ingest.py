@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import signal
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from batch_queue import OVERFLOW_POLICIES
+from epc import epc_mask, speedway_connect_filter
+from rfid_reader import reconnect_delay, running, stats, stats_thread, tag_queue, writer_thread
+from speedway_connect import (SOCKET_FIELDS, SOCKET_PORT, ConnectPost, SocketLineParser, parse_post,
+                              post_batch)
+from tag_batch import now_us, reader_table
+from tag_sink import add_sink_arguments, open_sink_from_args
+
+logger = logging.getLogger('connect_ingest')
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024  # A reader that fell far behind can post a large backlog
+
+async def queue_batch(batch):
+    """Hand a batch to the writer thread's queue without stalling the event loop."""
+    if tag_queue.policy == 'block':
+        await asyncio.to_thread(tag_queue.put, batch)  # May wait for the writer to make room
+    else:
+        tag_queue.put(batch)
+
+def http_response(status: str, body: bytes = b'', keep_alive: bool = True) -> bytes:
+    return (f"HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('ascii') + body
+
+class IngestServer:
+    """Minimal asyncio HTTP/1.1 server for Speedway Connect's HTTP POST output.
+
+    Each POST is parsed in one pass, packed into a TagReadBatch and handed to
+    the writer thread's queue before the 200 goes back, so the reader can
+    send its next POST straight away; disk writes never happen on the event
+    loop. Keep-alive connections, chunked bodies and "Expect: 100-continue"
+    (libcurl sends it for larger POSTs) are supported.
+    """
+
+    def __init__(self, path: str = '/rfid', epc_prefix: Optional[str] = None):
+        self.path = path
+        self.epc_prefix = epc_prefix
+        self.posts: Dict[str, int] = {}  # Reader name -> POSTs received
+        self.rejected = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    break  # Client closed the connection
+                except asyncio.LimitOverrunError:
+                    writer.write(http_response('431 Request Header Fields Too Large', keep_alive=False))
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, target, version = (request_line.split(' ') + ['', ''])[:3]
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+
+                if headers.get('expect', '').lower() == '100-continue':
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    body = await self._read_chunked(reader)
+                else:
+                    try:
+                        length = int(headers.get('content-length') or 0)
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        writer.write(http_response('400 Bad Request', keep_alive=False))
+                        break
+                    if length > MAX_BODY_BYTES:
+                        writer.write(http_response('413 Payload Too Large', keep_alive=False))
+                        break
+                    body = await reader.readexactly(length)
+
+                if method != 'POST' or target.split('?')[0] != self.path:
+                    writer.write(http_response('404 Not Found', keep_alive=keep_alive))
+                else:
+                    writer.write(http_response(*await self._ingest(body), keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.debug(f"Connection from {peer} ended: {e}")
+        except asyncio.CancelledError:
+            pass  # Server shutting down
+        finally:
+            writer.close()
+
+    async def _read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            length = int((await reader.readline()).split(b';')[0], 16)
+            if length == 0:
+                await reader.readuntil(b'\r\n')  # Trailers end with an empty line
+                return b''.join(chunks)
+            size += length
+            if size > MAX_BODY_BYTES:
+                raise ValueError("Chunked body too large")
+            chunks.append(await reader.readexactly(length))
+            await reader.readexactly(2)
+
+    async def _ingest(self, body: bytes):
+        """Parse one POST and queue its reads; returns (status, body) for the response."""
+        received_us = now_us()
+        try:
+            post = parse_post(body)
+            name = post.reader_name or post.mac_address or 'speedway'
+            batch = post_batch(post, received_us, reader_table.intern(name), self.epc_prefix)
+        except ValueError as e:
+            self.rejected += 1
+            logger.warning(f"Rejected POST: {e}")
+            return '400 Bad Request', str(e).encode()
+        self.posts[name] = self.posts.get(name, 0) + 1
+        stats.reports += 1
+        stats.bytes += len(body)
+        stats.reads += len(batch)
+        if batch:
+            await queue_batch(batch)
+        return '200 OK', b'OK'
+
+async def socket_client(host: str, port: int, fields: Sequence[str], epc_prefix: Optional[str] = None):
+    """Read Speedway Connect's socket output (socketServer=1) until cancelled, reconnecting with backoff.
+
+    Rows go through the same post_batch() as HTTP POSTs, so filters, reader
+    attribution and sinks behave the same; each chunk received becomes one
+    batch, without waiting for the reader's HTTP post interval.
+    """
+    name = f"{host}:{port}"
+    reader_id = reader_table.intern(name)
+    failures = 0
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            failures += 1
+            delay = reconnect_delay(failures)
+            logger.warning(f"{name}: connect failed ({e}), retrying in {delay:.1f} s")
+            await asyncio.sleep(delay)
+            continue
+        logger.info(f"{name}: connected to Speedway Connect socket")
+        failures = 0
+        parser = SocketLineParser()
+        try:
+            while True:
+                data = await reader.read(64 * 1024)
+                if not data:
+                    break
+                stats.bytes += len(data)
+                rows = parser.feed(data)
+                if not rows:
+                    continue
+                try:
+                    batch = post_batch(ConnectPost(name, '', list(fields), rows), now_us(), reader_id, epc_prefix)
+                except ValueError as e:
+                    logger.warning(f"{name}: skipped {len(rows)} unparseable line(s): {e}")
+                    continue
+                stats.reports += 1
+                stats.reads += len(batch)
+                if batch:
+                    await queue_batch(batch)
+        except ConnectionError as e:
+            logger.warning(f"{name}: {e}")
+        finally:
+            writer.close()
+        failures += 1
+        delay = reconnect_delay(failures)
+        logger.warning(f"{name}: connection closed, reconnecting in {delay:.1f} s")
+        await asyncio.sleep(delay)
+
+async def serve(server: IngestServer, host: str, port: int, duration: Optional[float],
+                sockets: List[str] = (), fields: Sequence[str] = SOCKET_FIELDS):
+    """Accept POSTs, or read the `sockets` (HOST[:PORT]) instead, until `duration` elapses or SIGINT."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    if duration:
+        loop.call_later(duration, stop.set)
+    if sockets:
+        clients = []
+        for address in sockets:
+            socket_host, _, socket_port = address.partition(':')
+            clients.append(asyncio.create_task(socket_client(
+                socket_host, int(socket_port) if socket_port else SOCKET_PORT, fields, server.epc_prefix)))
+        await stop.wait()
+        logger.info("Stopping socket clients")
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        return
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_BYTES, backlog=512)
+    logger.info(f"Listening for Speedway Connect POSTs on http://{host}:{port}{server.path}")
+    async with listener:
+        await stop.wait()
+    logger.info("Stopping server")
+
+def main():
+    parser = argparse.ArgumentParser(description="Async ingest for Speedway Connect HTTP POSTs or socket output")
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=5050, help='Port to listen on (httpPostURL on the reader)')
+    parser.add_argument('--path', default='/rfid', help='URL path the reader posts to')
+    parser.add_argument('--duration', type=float, help='Run duration in seconds')
+    parser.add_argument('--socket', action='append', default=[], metavar='HOST[:PORT]',
+                        help=f'Connect to a reader\'s Speedway Connect socket output (port {SOCKET_PORT} by default) '
+                             'instead of accepting HTTP POSTs (repeatable)')
+    parser.add_argument('--fields', default=','.join(SOCKET_FIELDS),
+                        help='Column order of the socket lines, matching the fields enabled on the reader')
+    parser.add_argument('--epc-filter', metavar='HEX',
+                        help='Only keep EPCs starting with this hex prefix; prints the matching '
+                             'Speedway Connect settings so the reader can filter too')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level')
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help='Seconds between throughput summary lines (0 to disable)')
+    parser.add_argument('--queue-capacity', type=int, default=100_000,
+                        help='Maximum tag reads buffered ahead of the writer thread')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='What to do when the buffer is full')
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    epc_prefix = None
+    if args.epc_filter:
+        try:
+            bit_count, mask = epc_mask(args.epc_filter)
+        except ValueError as e:
+            parser.error(str(e))
+        epc_prefix = mask.hex()[:bit_count // 4]
+        logger.info("Set these in the Speedway Connect configuration so the reader only reports matching tags:\n"
+                    + speedway_connect_filter(epc_prefix))
+    if args.socket and 'epc' not in args.fields.split(','):
+        parser.error("--fields must include epc")
+    tag_queue.configure(args.queue_capacity, args.overflow)
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    sink = open_sink_from_args(args, f'rfid_data_{timestamp}')
+    server = IngestServer(args.path, epc_prefix)
+
+    running.set()
+    writer_t = threading.Thread(target=writer_thread, args=(sink,))
+    writer_t.start()
+    if args.stats_interval > 0:
+        threading.Thread(target=stats_thread, args=(args.stats_interval,), daemon=True).start()
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.duration, args.socket, args.fields.split(',')))
+    finally:
+        tag_queue.close()
+        running.clear()
+        writer_t.join()
+    for name, posts in sorted(server.posts.items()):
+        logger.info(f"{name}: {posts} POSTs")
+    if server.rejected:
+        logger.warning(f"{server.rejected} POSTs rejected")
+    logger.info(f"Wrote {stats.written} tag reads to {getattr(sink, 'manifest_path', sink.path)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import csv
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from spill_log import SpillLog
+from tag_sink import DEFAULT_FSYNC_INTERVAL
+
+logger = logging.getLogger('csv_export')
+
+class SchemaCSVWriter:
+    """Incremental CSV export whose columns are fixed by the first rows written.
+
+    The first write() sets the header, typically from the first POST's
+    field_names, and every later row is written straight out in that column
+    order: one pass, no buffering of the run. Rows that carry a subset of the
+    columns are padded. If a write brings fields the header does not have,
+    the schema evolves: the current file is closed and a new segment starts
+    with the old columns followed by the new ones. The first file is
+    <stem>.csv and later segments <stem>.0001.csv, <stem>.0002.csv, ...
+    The segments are a SpillLog, so each write is flushed and fsync'd at
+    most every `fsync_interval` seconds.
+    """
+
+    def __init__(self, stem: str, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.stem = stem
+        self.fieldnames: Optional[List[str]] = None
+        self.written = 0
+        self._log = SpillLog(fsync_interval)
+        self.paths = self._log.paths
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()  # Flask handles POSTs on several threads
+        self._writer = None
+
+    def write(self, field_names: Sequence[str], rows: Iterable[Sequence[str]]):
+        """Append rows whose values line up with `field_names`."""
+        with self._lock:
+            if self.fieldnames is None or any(name not in self._index for name in field_names):
+                self._evolve(field_names)
+            count = 0
+            if list(field_names) == self.fieldnames:
+                for row in rows:
+                    self._writer.writerow(row)
+                    count += 1
+            else:
+                positions = [self._index[name] for name in field_names]
+                width = len(self.fieldnames)
+                for row in rows:
+                    out = [''] * width
+                    for position, value in zip(positions, row):
+                        out[position] = value
+                    self._writer.writerow(out)
+                    count += 1
+            self.written += count
+            self._log.sync()
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+
+    def _evolve(self, field_names: Sequence[str]):
+        """Start a new segment whose header adds any fields not seen yet (caller holds the lock)."""
+        fieldnames = list(self.fieldnames or [])
+        fieldnames.extend(name for name in dict.fromkeys(field_names) if name not in self._index)
+        path = f"{self.stem}.csv" if not self.paths else f"{self.stem}.{len(self.paths):04d}.csv"
+        if self.paths:
+            logger.info(f"New fields {fieldnames[len(self.fieldnames):]}, continuing in {path}")
+        self.fieldnames = fieldnames
+        self._index = {name: i for i, name in enumerate(fieldnames)}
+        self._writer = csv.writer(self._log.open_segment(path))
+        self._writer.writerow(fieldnames)
@@ -0,0 +1,81 @@
+import collections
+from typing import Dict, Tuple
+
+from tag_batch import TagReadBatch, now_us
+
+# Each window is split into this many expiry buckets
+BUCKETS_PER_WINDOW = 8
+
+class DedupWindow:
+    """Suppress repeat reads of the same (reader, EPC, antenna) within a time window.
+
+    Mirrors Speedway Connect's softwareFilterEnabled / softwareFilterWindowSec:
+    a tag on an antenna is reported once, and again only after `window_s`
+    seconds have passed since it was last reported. Windows are measured on
+    the reads' own timestamps, so replays and live captures behave alike;
+    reads without one (missing or 0) use the time their batch arrived.
+
+    Reported keys are kept in a dict of last-report times plus a deque of
+    time buckets listing the keys reported in each. Expiry pops whole buckets
+    that have fallen out of the window, so every key is inserted and removed
+    once per report: O(1) amortized per read, with memory bounded by the tags
+    seen in one window.
+    """
+
+    def __init__(self, window_s: float):
+        self.window_us = int(window_s * 1_000_000)
+        self._bucket_us = max(1, self.window_us // BUCKETS_PER_WINDOW)
+        self._last: Dict[Tuple[int, int, int], int] = {}  # key -> timestamp of last report
+        self._buckets = collections.deque()  # [bucket index, keys reported in it]
+        self.passed = 0
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def _expire(self, timestamp_us: int):
+        cutoff = timestamp_us - self.window_us
+        bucket_us = self._bucket_us
+        last = self._last
+        buckets = self._buckets
+        while buckets and (buckets[0][0] + 1) * bucket_us <= cutoff:
+            index, keys = buckets.popleft()
+            end = (index + 1) * bucket_us
+            for key in keys:
+                # Keys reported again since sit in a newer bucket too; keep those
+                if last.get(key, end) < end:
+                    del last[key]
+
+    def filter(self, batch: TagReadBatch) -> TagReadBatch:
+        """Return the reads that are not repeats within the window, in order."""
+        if not batch:
+            return batch
+        last = self._last
+        window_us = self.window_us
+        bucket_us = self._bucket_us
+        buckets = self._buckets
+        arrival_us = None
+        keep = []
+        for i, (ts, key) in enumerate(zip(batch.timestamp_us,
+                                          zip(batch.reader_id, batch.epc_id, batch.antenna))):
+            if not ts:
+                if arrival_us is None:
+                    arrival_us = now_us()
+                ts = arrival_us
+            if buckets and (buckets[0][0] + 1) * bucket_us <= ts - window_us:  # Oldest bucket out of the window
+                self._expire(ts)
+            previous = last.get(key)
+            if previous is not None and ts - previous < window_us:
+                continue
+            last[key] = ts
+            index = ts // bucket_us
+            if buckets and buckets[-1][0] >= index:
+                buckets[-1][1].append(key)  # Out-of-order reads join the newest bucket
+            else:
+                buckets.append([index, [key]])
+            keep.append(i)
+        self.passed += len(keep)
+        self.suppressed += len(batch) - len(keep)
+        if len(keep) == len(batch):
+            return batch
+        return batch.select(keep)
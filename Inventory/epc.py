@@ -0,0 +1,84 @@
+import string
+from typing import Tuple, Union
+
+_HEX_DIGITS = frozenset(string.hexdigits)
+_HEX_DIGIT_BYTES = frozenset(string.hexdigits.encode())
+
+def canonical_epc(value: Union[str, bytes, bytearray, memoryview]) -> str:
+    """Normalize any EPC form seen in this repo to lowercase hex text.
+
+    Accepts raw EPC bytes from an LLRP report, plain hex ("303435FC..."), the
+    repr of a bytes object as written by older sllurp captures ("b'3034...'"),
+    hex text that sllurp handed back as ASCII bytes (b'3034...'), and the
+    double-encoded form in the RunTimestamp captures, where each hex digit was
+    itself written as two hex digits ("3330..." for "30..."). Raises
+    ValueError for anything that is not hex after unwrapping.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value)
+        if value and len(value) % 2 == 0 and set(value) <= _HEX_DIGIT_BYTES:
+            text = value.decode('ascii')  # sllurp returns the EPC as ASCII hex bytes
+        else:
+            return value.hex()
+    else:
+        text = value.strip().strip('"')
+        if text[:2] in ("b'", 'b"') and text[-1:] == text[1]:
+            text = text[2:-1]
+    text = text.lower()
+    if text.startswith('0x'):
+        text = text[2:]
+    if not text or not set(text) <= _HEX_DIGITS or len(text) % 2:
+        raise ValueError(f"Not a hex EPC: {value!r}")
+    # Hex of hex: every byte is itself an ASCII hex digit (only checked for the
+    # 48-digit form the RunTimestamp captures use, a plain 192-bit EPC is rare)
+    if len(text) == 48:
+        decoded = bytes.fromhex(text)
+        if set(decoded) <= _HEX_DIGIT_BYTES:
+            text = decoded.decode('ascii').lower()
+    return text
+
+def epc_bytes(value: Union[str, bytes, bytearray, memoryview]) -> bytes:
+    """canonical_epc() as raw bytes, the key EPCTable interns."""
+    return bytes.fromhex(canonical_epc(value))
+
+# EPC memory bank, and the bit address of the EPC itself (after the CRC and PC words)
+EPC_BANK = 1
+EPC_BIT_POINTER = 32
+MAX_EPC_BITS = 496
+
+def epc_mask(prefix: str) -> Tuple[int, bytes]:
+    """(bit count, mask bytes) for a C1G2 filter matching EPCs that start with `prefix`.
+
+    `prefix` is hex at nibble granularity; a full EPC makes an exact match for
+    tags of that length.
+    """
+    text = prefix.strip().lower()
+    if len(text) % 2 == 0 and text:
+        text = canonical_epc(text)
+    elif text.startswith('0x'):
+        text = text[2:]
+    if not text or not set(text) <= _HEX_DIGITS or len(text) * 4 > MAX_EPC_BITS:
+        raise ValueError(f"Not a hex EPC prefix: {prefix!r}")
+    return len(text) * 4, bytes.fromhex(text + '0' * (len(text) % 2))
+
+def mask_matches(epc: bytes, bit_count: int, mask: bytes) -> bool:
+    """True if the first `bit_count` bits of `epc` equal the mask, as a reader's Select would."""
+    whole, rest = divmod(bit_count, 8)
+    if len(epc) * 8 < bit_count or epc[:whole] != mask[:whole]:
+        return False
+    if rest:
+        keep = (0xFF << (8 - rest)) & 0xFF
+        return epc[whole] & keep == mask[whole] & keep
+    return True
+
+def speedway_connect_filter(prefix: str) -> str:
+    """Speedway Connect config lines that make the reader itself apply an EPC prefix filter."""
+    bit_count, mask = epc_mask(prefix)
+    return '\n'.join([
+        'c1g2FilterEnabled=1',
+        'c1g2FilterAction=0',
+        f'c1g2FilterBank={EPC_BANK}',
+        f'c1g2FilterPointer={EPC_BIT_POINTER}',
+        f'c1g2FilterMask={mask.hex().upper()[:(bit_count + 3) // 4]}',
+        f'c1g2FilterLen={bit_count}',
+    ])
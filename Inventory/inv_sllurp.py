@@ -1,11 +1,18 @@
-import csv
+import argparse
 import subprocess
 import time
 from datetime import datetime
-import ast
+import signal
+import threading
 import sys
 import logging
 import socket
+import queue
+
+from epc import canonical_epc, epc_mask
+from sllurp_stream import SAW_TAGS, SawTagStream
+from tag_batch import TagReadBatch, now_us
+from tag_sink import add_sink_arguments, open_sink_from_args
 
 # Configure logging (console with DEBUG level)
 logging.basicConfig(
@@ -46,130 +53,237 @@ COMMAND = [
     "--impinj-reports"
 ]
 
-def init_csv(csv_file):
-    """Initialize CSV file with headers."""
-    with open(csv_file, 'w', newline='') as csv_file_handle:
-        headers = ['timestamp', 'antenna', 'rssi', 'epc', 'phase_angle', 'channel_index', 'doppler_frequency']
-        csv_writer = csv.writer(csv_file_handle)
-        csv_writer.writerow(headers)
-    logging.info(f"Initialized CSV: {csv_file}")
-
-def parse_output(output):
-    """Parse sllurp inventory output to extract tag data."""
-    tags = []
-    logging.debug(f"Raw output: {output}")
-    start = output.find("[{")
-    end = output.rfind("}]") + 2
-    if start == -1 or end == -1:
-        logging.warning("No tag data found in output")
-        return tags
-    
-    tag_list_str = output[start:end]
+def tag_record(tag):
+    """Convert one sllurp tag report dict to a tag record, or None if it has no usable EPC."""
     try:
-        tag_list = ast.literal_eval(tag_list_str)
-        for tag in tag_list:
-            tags.append({
-                'epc': tag.get('EPC-96', b'').decode('utf-8', errors='ignore'),
-                'antenna': tag.get('AntennaID', 0),
-                'rssi': tag.get('PeakRSSI', 0),
-                'phase_angle': tag.get('ImpinjRFPhaseAngle', None),
-                'channel_index': tag.get('ChannelIndex', None),
-                'doppler_frequency': tag.get('ImpinjRFDopplerFrequency', None),
-                'last_seen_timestamp': tag.get(TIMESTAMP_FIELD, 0)
-            })
-        antenna_ids = set(tag['antenna'] for tag in tags)
-        if len(antenna_ids) < 4:
-            logging.warning(f"Incomplete antenna cycle: {antenna_ids}")
-        logging.info(f"Parsed {len(tags)} tags")
-    except (SyntaxError, ValueError) as e:
-        logging.error(f"Failed to parse output: {e}")
-    
-    return tags
+        epc = canonical_epc(tag.get('EPC-96') or tag.get('EPC') or b'')
+    except ValueError:
+        logging.warning(f"Skipping tag without a usable EPC: {tag}")
+        return None
+    return {
+        'epc': epc,
+        'antenna': tag.get('AntennaID', 0),
+        'rssi': tag.get('PeakRSSI', 0),
+        'phase_angle': tag.get('ImpinjRFPhaseAngle', None),
+        'channel_index': tag.get('ChannelIndex', None),
+        'doppler_frequency': tag.get('ImpinjRFDopplerFrequency', None),
+        'last_seen_timestamp': tag.get(TIMESTAMP_FIELD, 0),
+        'seen_count': tag.get('TagSeenCount', 1)
+    }
+
+# Raw sllurp output lines, (cycle, line), on their way to report_worker;
+# (cycle, None) ends a cycle and None stops the worker
+line_queue = queue.Queue()
+
+def report_worker(sink):
+    """Thread that parses queued sllurp output and writes the tags to the sink.
 
-def run_inventory():
-    """Run the sllurp inventory command and return parsed tag data."""
-    # Check LLRP port
+    Keeps parsing and disk writes off the inventory loop, so the next
+    sllurp cycle can start as soon as the previous one exits.
+    """
+    stream = SawTagStream()
+    written = 0
+    antenna_ids = set()
+    while True:
+        item = line_queue.get()
+        if item is None:
+            break
+        cycle, line = item
+        if line is not None:
+            try:
+                tags = [record for record in map(tag_record, stream.feed(line)) if record]
+                if tags:
+                    batch = to_batch(tags)
+                    sink.write(batch)
+                    written += len(batch)
+                    antenna_ids.update(batch.antenna)
+            except Exception as e:
+                logging.error(f"Failed to write tags: {e}")
+            continue
+        # End of a cycle
+        if stream.errors:
+            logging.warning(f"Cycle {cycle}: {stream.errors} tag report(s) could not be parsed")
+        if not written:
+            logging.info(f"Cycle {cycle}: no tags detected")
+        elif len(antenna_ids) < 4:
+            logging.warning(f"Cycle {cycle}: incomplete antenna cycle: {antenna_ids}")
+        logging.info(f"Cycle {cycle}: logged {written} tags to {sink.path}")
+        stream = SawTagStream()
+        written = 0
+        antenna_ids = set()
+    logging.info("Report worker stopped")
+
+def port_reachable():
+    """True if the reader's LLRP port accepts connections."""
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(2)
-        result = sock.connect_ex(('192.168.0.219', 5084))
+        result = sock.connect_ex((IP_ADDRESS, 5084))
         sock.close()
         if result != 0:
             logging.error("LLRP port 5084 not reachable")
-            time.sleep(2)  # Wait before retrying to allow reader recovery
-            return []
+            return False
+        return True
     except Exception as e:
         logging.error(f"Socket check failed: {e}")
-        time.sleep(2)  # Wait before retrying
-        return []
-    
+        return False
+
+def run_inventory(cycle):
+    """Run one sllurp inventory cycle, queueing its output for report_worker.
+
+    Returns the seconds the reader spent inventorying: from the first tag
+    report to the stop signal, so process start-up, connection and ROSpec
+    setup count as dead air. Returns None if every attempt failed.
+    """
     for attempt in range(MAX_RETRIES):
         try:
             logging.info(f"Running command (attempt {attempt+1}): {' '.join(COMMAND)}")
+            # sllurp logs its reports, so read both streams as one
             process = subprocess.Popen(
                 COMMAND,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
             )
+            stopped_at = []
+
+            def stop():
+                stopped_at.append(time.time())
+                process.terminate()
+
+            stopper = threading.Timer(INTERVAL, stop)
+            stopper.start()
             
-            time.sleep(INTERVAL)
-            
-            process.terminate()
+            first_report = None
+            last_line = ''
             try:
-                stdout, stderr = process.communicate(timeout=2)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                stdout, stderr = process.communicate()
-                logging.warning("Process killed after failing to terminate")
+                for line in process.stdout:
+                    if first_report is None and SAW_TAGS in line:
+                        first_report = time.time()
+                    line_queue.put((cycle, line))
+                    if line.strip():
+                        last_line = line.strip()
+            finally:
+                stopper.cancel()
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    logging.warning("Process killed after failing to terminate")
             
-            if process.returncode != 0 and stderr:
-                logging.error(f"Command error: {stderr}")
+            if first_report is None and process.returncode not in (0, -signal.SIGTERM):
+                logging.error(f"Command error (exit {process.returncode}): {last_line}")
                 continue
-            
-            tags = parse_output(stdout)
-            if not tags:
-                logging.info("No tags detected in this cycle")
-            return tags
+            if first_report is None:
+                return 0.0
+            return max(0.0, (stopped_at[0] if stopped_at else time.time()) - first_report)
         except Exception as e:
             logging.error(f"Attempt {attempt+1} failed: {e}")
             time.sleep(1)
     logging.error("All attempts failed")
-    return []
-
-def log_tags(tags, csv_file, epc_filter=None):
-    """Log tag data to CSV, filtering by EPC if specified."""
-    antenna_ids = set(tag['antenna'] for tag in tags)
-    if len(antenna_ids) < 4:
-        logging.warning(f"Skipping incomplete cycle with antennas: {antenna_ids}")
-        return
-    with open(csv_file, 'a', newline='') as csv_file_handle:
-        csv_writer = csv.writer(csv_file_handle)
-        filtered_count = 0
-        for tag in tags:
-            if epc_filter is None or tag['epc'] == epc_filter:
-                timestamp_us = tag.get('last_seen_timestamp', 0)
-                timestamp = datetime.fromtimestamp(timestamp_us / 1e6).isoformat() if timestamp_us else datetime.now().isoformat()
-                csv_writer.writerow([
-                    timestamp,
-                    tag['antenna'],
-                    tag['rssi'],
-                    tag['epc'],
-                    tag['phase_angle'],
-                    tag['channel_index'],
-                    tag['doppler_frequency']
-                ])
-                filtered_count += 1
-        if filtered_count > 0:
-            logging.info(f"Logged {filtered_count} tags to CSV (EPC filter: {epc_filter or 'None'})")
-        else:
-            logging.info(f"No tags logged to CSV (EPC filter: {epc_filter or 'None'})")
+    return None
+
+def to_batch(tags):
+    """Pack tag records into a TagReadBatch."""
+    batch = TagReadBatch()
+    for tag in tags:
+        batch.append(
+            tag.get('last_seen_timestamp') or now_us(),
+            tag['antenna'],
+            tag['rssi'],
+            bytes.fromhex(tag['epc']),
+            tag['phase_angle'],
+            tag['channel_index'],
+            tag['doppler_frequency'],
+            tag['seen_count']
+        )
+    return batch
+
+def sllurp_config(epc_prefix=None):
+    """LLRPReaderConfig settings equivalent to COMMAND's command-line options."""
+    config = {
+        'antennas': [int(a) for a in ANTENNAS.split(',')],
+        'tx_power': int(POWER),
+        'session': int(SESSION),
+        'mode_identifier': int(MODE_IDENTIFIER),
+        'impinj_search_mode': int(SEARCH_MODE),
+        'impinj_extended_configuration': True,
+        'report_every_n_tags': 1,
+        'start_inventory': True,
+        'reconnect': True,
+        'tag_content_selector': {
+            'EnableROSpecID': False,
+            'EnableSpecIndex': False,
+            'EnableInventoryParameterSpecID': False,
+            'EnableAntennaID': True,
+            'EnableChannelIndex': True,
+            'EnablePeakRSSI': True,
+            'EnableFirstSeenTimestamp': False,
+            'EnableLastSeenTimestamp': True,
+            'EnableTagSeenCount': True,
+            'EnableAccessSpecID': False,
+        },
+        'impinj_tag_content_selector': {
+            'EnableRFPhaseAngle': True,
+            'EnablePeakRSSI': False,
+            'EnableRFDopplerFrequency': True
+        },
+    }
+    if epc_prefix:
+        config['tag_filter_mask'] = [epc_prefix]
+    return config
+
+def run_session(sink, end_time, epc_prefix=None):
+    """Inventory over one persistent sllurp connection until end_time (None = until Ctrl+C).
+
+    Tag reports arrive on sllurp's client thread and are written as they
+    come, so there is no per-cycle process spawn, reader reset or reconnect.
+    """
+    try:
+        from sllurp.llrp import LLRP_DEFAULT_PORT, LLRPReaderClient, LLRPReaderConfig  # type: ignore
+    except ImportError:
+        raise RuntimeError("Persistent session mode requires sllurp (pip install sllurp)")
+
+    written = 0
+
+    def on_tag_report(reader, tag_reports):
+        nonlocal written
+        batch = to_batch(record for record in map(tag_record, tag_reports) if record)
+        if batch:
+            sink.write(batch)
+            written += len(batch)
+
+    reader = LLRPReaderClient(IP_ADDRESS, LLRP_DEFAULT_PORT, LLRPReaderConfig(sllurp_config(epc_prefix)))
+    reader.add_tag_report_callback(on_tag_report)
+    logging.info(f"Connecting to {IP_ADDRESS}:{LLRP_DEFAULT_PORT} (persistent session)")
+    reader.connect()
+    try:
+        last_written = 0
+        while reader.is_alive():
+            timeout = INTERVAL if end_time is None else min(INTERVAL, end_time - time.time())
+            if timeout <= 0:
+                logging.info("Runtime expired")
+                break
+            reader.join(timeout)
+            logging.info(f"Logged {written - last_written} tags in the last {INTERVAL} s ({written} total)")
+            last_written = written
+    finally:
+        reader.disconnect()
+        reader.join(5)
 
 def main():
     """Main function to handle user input and run inventory."""
-    # Generate unique CSV filename based on current timestamp
+    parser = argparse.ArgumentParser(description="Timed sllurp inventory cycles")
+    parser.add_argument('--persistent', action='store_true',
+                        help='Keep one sllurp connection open for the whole run instead of '
+                             'spawning "sllurp inventory" every cycle')
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    # Generate unique output filename based on current timestamp
     timestamp_str = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-    csv_file = f"rfid_tags_{timestamp_str}.csv"
     
     print("Enter runtime in seconds (or press Enter to run indefinitely):")
     runtime_input = input().strip()
@@ -194,39 +308,59 @@ def main():
         print("Running indefinitely (press Ctrl+C to stop)...")
         logging.info("Starting inventory indefinitely")
     
-    # Prompt for EPC filter
-    print("Enter EPC to filter (24-character hex, e.g., 303435fc8803d056d15b963f, or press Enter for no filter):")
+    # Prompt for EPC filter; sllurp sends it to the reader as a C1G2 tag mask
+    print("Enter EPC or EPC prefix to filter (hex, e.g., 303435fc8803d056d15b963f or 3034, "
+          "or press Enter for no filter):")
     epc_filter = input().strip()
+    prefix = None
     if epc_filter:
-        # Validate EPC: 24-character hexadecimal
-        if len(epc_filter) == 24 and all(c in '0123456789abcdefABCDEF' for c in epc_filter):
-            logging.info(f"Applying EPC filter: {epc_filter}")
-        else:
-            logging.warning(f"Invalid EPC filter '{epc_filter}' (must be 24-character hex). No filter applied.")
-            epc_filter = None
+        try:
+            bit_count, mask = epc_mask(epc_filter)
+            prefix = mask.hex()[:bit_count // 4]
+            COMMAND.extend(["--tag-filter-mask", prefix])
+            logging.info(f"Reader will only report EPCs starting with {prefix}")
+        except ValueError:
+            logging.warning(f"Invalid EPC filter '{epc_filter}' (must be hex). No filter applied.")
     else:
         logging.info("No EPC filter applied")
-        epc_filter = None
     
-    init_csv(csv_file)
+    sink = open_sink_from_args(args, f"rfid_tags_{timestamp_str}")
     
     cycle_count = 0
+    air_total = 0.0
+    loop_start = None
+    worker = None
     try:
+        if args.persistent:
+            run_session(sink, end_time, prefix)
+            return
+        worker = threading.Thread(target=report_worker, args=(sink,))
+        worker.start()
+        reachable = port_reachable()
+        loop_start = time.time()
+        # Cycles run back to back: the worker parses and writes the previous
+        # cycle's output while the next one is already inventorying
         while True:
             cycle_count += 1
             logging.info(f"Starting cycle {cycle_count}")
             if end_time and time.time() >= end_time:
                 logging.info("Runtime expired")
                 break
+            if not reachable:
+                time.sleep(2)  # Wait before retrying to allow reader recovery
+                reachable = port_reachable()
+                continue
             
             cycle_start = time.time()
-            tags = run_inventory()
-            if tags:
-                log_tags(tags, csv_file, epc_filter)
-            
+            air = run_inventory(cycle_count)
+            line_queue.put((cycle_count, None))
             elapsed = time.time() - cycle_start
-            sleep_time = max(0, INTERVAL - elapsed)
-            time.sleep(sleep_time)
+            if air is None:
+                reachable = port_reachable()
+                continue
+            air_total += air
+            logging.info(f"Cycle {cycle_count} duty cycle: {air / elapsed:.0%} "
+                         f"({air:.2f} s of {elapsed:.2f} s inventorying)")
     
     except KeyboardInterrupt:
         print("\nStopping inventory...")
@@ -235,6 +369,14 @@ def main():
         print(f"Error: {e}")
         logging.error(f"Unexpected error: {e}")
     finally:
+        if worker is not None:
+            line_queue.put(None)
+            worker.join()
+        if loop_start is not None and time.time() > loop_start:
+            total = time.time() - loop_start
+            logging.info(f"Overall duty cycle: {air_total / total:.0%} "
+                         f"({air_total:.1f} s of {total:.1f} s inventorying)")
+        sink.close()
         print("Inventory stopped.")
         logging.info("Inventory stopped")
 
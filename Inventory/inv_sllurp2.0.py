@@ -2,11 +2,14 @@ import csv
 import subprocess
 import time
 from datetime import datetime
-import ast
 import sys
 import logging
 import socket
 
+from epc import canonical_epc
+from sllurp_stream import parse_saw_tags
+from tag_batch import now_us
+
 # Configure logging (console with DEBUG level)
 logging.basicConfig(
     level=logging.DEBUG,
@@ -43,43 +46,40 @@ COMMAND = [
 def init_csv(csv_file):
     """Initialize CSV file with headers."""
     with open(csv_file, 'w', newline='') as csv_file_handle:
-        headers = ['timestamp', 'antenna', 'rssi', 'epc', 'phase_angle', 'channel_index', 'doppler_frequency']
+        headers = ['timestamp_us', 'antenna', 'rssi', 'epc', 'phase_angle', 'channel_index', 'doppler_frequency',
+                   'seen_count']
         csv_writer = csv.writer(csv_file_handle)
         csv_writer.writerow(headers)
     logging.info(f"Initialized CSV: {csv_file}")
 
-def parse_output(output, cycle_start_time, cycle_duration):
-    """Parse sllurp inventory output and expand TagSeenCount into individual reads."""
+def parse_output(output, cycle_start_us):
+    """Parse sllurp inventory output into one row per tag report, keeping TagSeenCount as seen_count."""
     tags = []
     logging.debug(f"Raw output: {output}")
-    start = output.find("[{")
-    end = output.rfind("}]") + 2
-    if start == -1 or end == -1:
+    tag_list = parse_saw_tags(output)
+    if not tag_list:
         logging.warning("No tag data found in output")
         return tags
     
-    tag_list_str = output[start:end]
-    try:
-        tag_list = ast.literal_eval(tag_list_str)
-        for tag in tag_list:
-            seen_count = tag.get('TagSeenCount', 1)
-            # Distribute timestamps linearly within the cycle duration
-            timestamp_interval = cycle_duration / seen_count if seen_count > 1 else 0
-            for i in range(seen_count):
-                read_timestamp = cycle_start_time + (i * timestamp_interval)
-                tags.append({
-                    'epc': tag.get('EPC-96', b'').decode('utf-8', errors='ignore'),
-                    'antenna': tag.get('AntennaID', 0),
-                    'rssi': tag.get('PeakRSSI', 0),
-                    'phase_angle': tag.get('ImpinjRFPhaseAngle', None),
-                    'channel_index': tag.get('ChannelIndex', None),
-                    'doppler_frequency': tag.get('ImpinjRFDopplerFrequency', None),
-                    'timestamp': read_timestamp
-                })
-        antenna_ids = set(tag['antenna'] for tag in tags)
-        logging.info(f"Parsed {len(tags)} individual reads (antennas: {antenna_ids})")
-    except (SyntaxError, ValueError) as e:
-        logging.error(f"Failed to parse output: {e}")
+    for tag in tag_list:
+        try:
+            epc = canonical_epc(tag.get('EPC-96', b''))
+        except ValueError:
+            logging.warning(f"Skipping tag without a usable EPC: {tag}")
+            continue
+        tags.append({
+            'epc': epc,
+            'antenna': tag.get('AntennaID', 0),
+            'rssi': tag.get('PeakRSSI', 0),
+            'phase_angle': tag.get('ImpinjRFPhaseAngle', None),
+            'channel_index': tag.get('ChannelIndex', None),
+            'doppler_frequency': tag.get('ImpinjRFDopplerFrequency', None),
+            'timestamp_us': tag.get('LastSeenTimestampUTC') or cycle_start_us,
+            'seen_count': tag.get('TagSeenCount', 1)
+        })
+    antenna_ids = set(tag['antenna'] for tag in tags)
+    seen = sum(tag['seen_count'] for tag in tags)
+    logging.info(f"Parsed {len(tags)} tag reports covering {seen} reads (antennas: {antenna_ids})")
     
     return tags
 
@@ -110,14 +110,14 @@ def run_inventory(cycle_duration):
                 text=True
             )
             
-            cycle_start_time = time.time()
+            cycle_start_us = now_us()
             stdout, stderr = process.communicate(timeout=cycle_duration + 2)  # Allow extra time for process to finish
             
             if process.returncode != 0 and stderr:
                 logging.error(f"Command error: {stderr}")
                 continue
             
-            tags = parse_output(stdout, cycle_start_time, cycle_duration)
+            tags = parse_output(stdout, cycle_start_us)
             if not tags:
                 logging.info("No tags detected in this cycle")
             return tags
@@ -138,15 +138,15 @@ def log_tags(tags, csv_file, epc_filter=None):
         filtered_count = 0
         for tag in tags:
             if epc_filter is None or tag['epc'] == epc_filter:
-                timestamp = datetime.fromtimestamp(tag['timestamp']).isoformat()
                 csv_writer.writerow([
-                    timestamp,
+                    tag['timestamp_us'],
                     tag['antenna'],
                     tag['rssi'],
                     tag['epc'],
                     tag['phase_angle'],
                     tag['channel_index'],
-                    tag['doppler_frequency']
+                    tag['doppler_frequency'],
+                    tag['seen_count']
                 ])
                 filtered_count += 1
         if filtered_count > 0:
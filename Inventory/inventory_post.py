@@ -1,9 +1,9 @@
 import subprocess
 import sys
-import time
-import ast
+import threading
 import csv
-import re
+
+from sllurp_stream import SawTagStream
 
 # Configuration
 HOST = '192.168.0.219'
@@ -12,33 +12,21 @@ SLLURP_COMMAND = ['sllurp', 'inventory', HOST, '-t', str(TIME), '-a', '0', '--im
 CSV_FILE = 'rfid_inventory.csv'
 COMMAND_TIMEOUT = TIME + 2  # Timeout slightly longer than TIME to allow command completion
 
-def parse_sllurp_output(output):
-    """Parse the sllurp command output to extract tag data."""
+def tag_rows(tag_list):
+    """Convert sllurp tag dicts into CSV rows, one per report with its TagSeenCount."""
     tags = []
-    # Look for the 'saw tag(s):' section
-    match = re.search(r"saw tag\(s\): (\[.*?\])", output, re.DOTALL)
-    if match:
-        try:
-            # Safely evaluate the tag list string as a Python object
-            tag_list_str = match.group(1)
-            tag_list = ast.literal_eval(tag_list_str)
-            for tag in tag_list:
-                # Get the number of times the tag was seen
-                tag_seen_count = tag.get('TagSeenCount', 1)
-                # Create a row for each tag read
-                for _ in range(tag_seen_count):
-                    tag_data = {
-                        'AntennaID': tag.get('AntennaID', 0),
-                        'EPC': tag.get('EPC', b'').decode('utf-8') if isinstance(tag.get('EPC'), bytes) else tag.get('EPC', ''),
-                        'FirstSeen': tag.get('FirstSeenTimestampUTC', 0),
-                        'LastSeen': tag.get('LastSeenTimestampUTC', 0),
-                        'ImpinjPeakRSSI': tag.get('ImpinjPeakRSSI', 0),
-                        'Phase Angle': tag.get('ImpinjRFPhaseAngle', 0),
-                        'Doppler Frequency': tag.get('ImpinjRFDopplerFrequency', 0),
-                    }
-                    tags.append(tag_data)
-        except (SyntaxError, ValueError) as e:
-            print(f"Error parsing tag data: {e}")
+    for tag in tag_list:
+        tag_data = {
+            'AntennaID': tag.get('AntennaID', 0),
+            'EPC': tag.get('EPC', b'').decode('utf-8') if isinstance(tag.get('EPC'), bytes) else tag.get('EPC', ''),
+            'FirstSeen': tag.get('FirstSeenTimestampUTC', 0),
+            'LastSeen': tag.get('LastSeenTimestampUTC', 0),
+            'ImpinjPeakRSSI': tag.get('ImpinjPeakRSSI', 0),
+            'Phase Angle': tag.get('ImpinjRFPhaseAngle', 0),
+            'Doppler Frequency': tag.get('ImpinjRFDopplerFrequency', 0),
+            'SeenCount': tag.get('TagSeenCount', 1),
+        }
+        tags.append(tag_data)
     return tags
 
 def write_to_csv(tags):
@@ -48,7 +36,8 @@ def write_to_csv(tags):
         return
 
     # Define the exact field order for the CSV
-    fieldnames = ['AntennaID', 'EPC', 'FirstSeen', 'LastSeen', 'ImpinjPeakRSSI', 'Phase Angle', 'Doppler Frequency']
+    fieldnames = ['AntennaID', 'EPC', 'FirstSeen', 'LastSeen', 'ImpinjPeakRSSI', 'Phase Angle', 'Doppler Frequency',
+                  'SeenCount']
     
     with open(CSV_FILE, 'a', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -69,33 +58,24 @@ def main():
             text=True
         )
         
-        # Wait for the command to complete or timeout
-        start_time = time.time()
-        output_lines = []
-        while process.poll() is None and time.time() - start_time < COMMAND_TIMEOUT:
-            line = process.stdout.readline()
-            if line:
-                print(line.strip())
-                output_lines.append(line)
-            time.sleep(0.1)
-
-        # Terminate the process if it's still running
-        if process.poll() is None:
-            print("Command timeout reached. Terminating...")
-            process.terminate()
-            process.wait(timeout=2)  # Wait for termination
+        # Terminate the process if it is still running at the timeout
+        stopper = threading.Timer(COMMAND_TIMEOUT, process.terminate)
+        stopper.start()
 
-        # Capture any remaining output
-        remaining_output, _ = process.communicate()
-        if remaining_output:
-            output_lines.append(remaining_output)
-            print(remaining_output.strip())
-
-        # Combine all output
-        full_output = ''.join(output_lines)
+        # Decode tag reports line by line as they are printed
+        stream = SawTagStream()
+        tags = []
+        try:
+            for line in process.stdout:
+                print(line.strip())
+                tags.extend(tag_rows(stream.feed(line)))
+        finally:
+            stopper.cancel()
+        process.wait()
+        if stream.errors:
+            print(f"Error parsing {stream.errors} tag report(s)")
 
-        # Parse output and save to CSV
-        tags = parse_sllurp_output(full_output)
+        # Save to CSV
         write_to_csv(tags)
 
     except subprocess.SubprocessError as e:
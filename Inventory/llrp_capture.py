@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import logging
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from tag_batch import now_us
+from tag_sink import add_sink_arguments, open_sink_from_args
+
+logger = logging.getLogger('llrp_capture')
+
+# File layout: CAPTURE_MAGIC, then records of (receive time in µs, length) + that
+# many raw bytes exactly as they came off the socket. A zero-length record
+# marks a new connection, where the LLRP framing starts over.
+CAPTURE_MAGIC = b'LLRPCAP\x01'
+CAPTURE_RECORD = struct.Struct('>qI')
+
+class CaptureWriter:
+    """Append raw LLRP stream chunks with receive timestamps to a capture file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[BinaryIO] = open(path, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+        self._lock = threading.Lock()  # Closed from the signal handler while the reader writes
+        self.chunks = 0
+        self.bytes = 0
+
+    def new_connection(self):
+        """Mark a (re)connect so replay restarts message framing."""
+        self._write(b'')
+
+    def write(self, data):
+        """Record one received chunk; usable as LLRPStream.tap."""
+        self._write(data)
+        self.chunks += 1
+        self.bytes += len(data)
+
+    def _write(self, data):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(CAPTURE_RECORD.pack(now_us(), len(data)))
+            self._file.write(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"Captured {self.chunks} chunks, {self.bytes} bytes to {self.path}")
+
+def read_capture(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Yield (receive timestamp µs, chunk) records; an empty chunk marks a new connection."""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not an LLRP capture")
+        while True:
+            header = f.read(CAPTURE_RECORD.size)
+            if len(header) < CAPTURE_RECORD.size:
+                return  # A capture cut off mid-record just ends there
+            timestamp_us, length = CAPTURE_RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield timestamp_us, data
+
+def replay(path: str, speed: Optional[float], on_batch) -> Tuple[int, int, int, float]:
+    """Decode a capture, passing each RO_ACCESS_REPORT batch to `on_batch`.
+
+    `speed` is a multiple of real time (1.0 = as captured) or None to go as
+    fast as possible. Returns (chunks, bytes, reads, elapsed seconds).
+    """
+    # rfid_reader imports this module for CaptureWriter, so import it lazily
+    from rfid_reader import LLRP_MSG_RO_ACCESS_REPORT, LLRPStream, parse_ro_access_report
+
+    stream = LLRPStream()
+    chunks = nbytes = reads = 0
+    first_capture_us = None
+    start = time.perf_counter()
+    for timestamp_us, data in read_capture(path):
+        if not data:
+            stream = LLRPStream()
+            continue
+        if speed:
+            if first_capture_us is None:
+                first_capture_us = timestamp_us
+            delay = (timestamp_us - first_capture_us) / 1e6 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        stream.feed(data)
+        chunks += 1
+        nbytes += len(data)
+        for msg_type, msg_id, body in stream.messages():
+            if msg_type == LLRP_MSG_RO_ACCESS_REPORT:
+                batch = parse_ro_access_report(body)
+                if batch:
+                    reads += len(batch)
+                    on_batch(batch)
+    return chunks, nbytes, reads, time.perf_counter() - start
+
+def _parse_speed(value: str) -> Optional[float]:
+    if value == 'max':
+        return None
+    speed = float(value.rstrip('x'))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+def main():
+    import rfid_reader
+
+    parser = argparse.ArgumentParser(description="Replay a raw LLRP capture through the decoder and output sinks")
+    parser.add_argument('capture', help='File written by rfid_reader.py --capture-raw')
+    parser.add_argument('--speed', type=_parse_speed, default=None,
+                        help="1 (or 1x) for real time, N for N times faster, 'max' (default) for no pacing")
+    parser.add_argument('--decode-only', action='store_true', help='Decode but do not write any output')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level')
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+    if args.decode_only:
+        chunks, nbytes, reads, elapsed = replay(args.capture, args.speed, lambda batch: None)
+        written_elapsed = elapsed
+    else:
+        # Same queue and writer thread as a live capture
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        sink = open_sink_from_args(args, f'replay_{timestamp}')
+        rfid_reader.running.set()
+        writer_t = threading.Thread(target=rfid_reader.writer_thread, args=(sink,))
+        writer_t.start()
+        start = time.perf_counter()
+        try:
+            chunks, nbytes, reads, elapsed = replay(args.capture, args.speed, rfid_reader.tag_queue.put)
+        finally:
+            rfid_reader.tag_queue.close()
+            rfid_reader.running.clear()
+            writer_t.join()
+        written_elapsed = time.perf_counter() - start
+
+    logger.info(f"Replayed {chunks} chunks, {nbytes / 1024 / 1024:.1f} MiB, {reads} reads")
+    logger.info(f"Decode: {elapsed:.3f} s, {reads / max(elapsed, 1e-9):,.0f} reads/s, "
+                f"{nbytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MiB/s")
+    if not args.decode_only:
+        logger.info(f"Decode + write: {written_elapsed:.3f} s, {reads / max(written_elapsed, 1e-9):,.0f} reads/s")
+
+if __name__ == '__main__':
+    main()
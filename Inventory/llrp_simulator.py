@@ -0,0 +1,527 @@
+import argparse
+import asyncio
+import csv
+import datetime
+import glob
+import logging
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rfid_reader import (IMPINJ_VENDOR_ID, LLRP_HEADER, LLRP_MSG_CLOSE_CONNECTION, LLRP_MSG_CUSTOM_MESSAGE,
+                         LLRP_MSG_ERROR_MESSAGE, LLRP_MSG_GET_READER_CAPABILITIES, LLRP_MSG_KEEPALIVE,
+                         LLRP_MSG_KEEPALIVE_ACK, LLRP_MSG_SET_READER_CONFIG, LLRP_PARAM_KEEPALIVE_SPEC,
+                         LLRP_MSG_READER_EVENT_NOTIFICATION, LLRP_MSG_RO_ACCESS_REPORT,
+                         LLRP_PARAM_C1G2_STATE_UNAWARE_FILTER_ACTION, LLRP_PARAM_C1G2_TAG_INVENTORY_MASK,
+                         LLRP_PARAM_CUSTOM, FILTER_ACTION_SHIFT, LLRPStream, build_tag_report_data)
+from epc import EPC_BANK, EPC_BIT_POINTER, canonical_epc, mask_matches
+from speedway_connect import SOCKET_FIELDS
+from tag_batch import now_us
+
+logger = logging.getLogger('llrp_simulator')
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_CAPTURE = os.path.join(REPO_ROOT, 'Testing', 'Test8', '(1,1).csv')
+# GET_READER_CAPABILITIES_RESPONSE recorded from a real Speedway (sllurp's example data)
+CAPS_FILE = os.path.join(REPO_ROOT, 'sllurp-develop', 'examples', 'caps.dat')
+
+# Request message type -> response message type
+RESPONSE_TYPES = {
+    1: 11,   # GET_READER_CAPABILITIES
+    2: 12,   # GET_READER_CONFIG
+    3: 13,   # SET_READER_CONFIG
+    14: 4,   # CLOSE_CONNECTION
+    20: 30,  # ADD_ROSPEC
+    21: 31,  # DELETE_ROSPEC
+    22: 32,  # START_ROSPEC
+    23: 33,  # STOP_ROSPEC
+    24: 34,  # ENABLE_ROSPEC
+    25: 35,  # DISABLE_ROSPEC
+    26: 36,  # GET_ROSPECS
+    40: 50,  # ADD_ACCESSSPEC
+    41: 51,  # DELETE_ACCESSSPEC
+    42: 52,  # ENABLE_ACCESSSPEC
+    43: 53,  # DISABLE_ACCESSSPEC
+    44: 54,  # GET_ACCESSSPECS
+}
+START_REPORTS = (22, 24)         # START_ROSPEC, ENABLE_ROSPEC (our ROSpecs start immediately)
+STOP_REPORTS = (21, 23, 25)      # DELETE_ROSPEC, STOP_ROSPEC, DISABLE_ROSPEC
+NO_RESPONSE = (LLRP_MSG_KEEPALIVE_ACK, 64)  # KEEPALIVE_ACK, ENABLE_EVENTS_AND_REPORTS
+GET_READER_CONFIG = 2
+ADD_ROSPEC = 20
+DELETE_ROSPEC = 21
+STATUS_UNSUPPORTED_PARAMETER = 111
+STATUS_UNSUPPORTED_MESSAGE = 109
+STATUS_NO_ROSPEC = 200  # A_Invalid: no ROSpec to enable or start
+MAX_C1G2_FILTERS = 2    # Per InventoryParameterSpec on a Speedway
+
+# Impinj custom parameter subtypes a Speedway accepts inside an ROSpec. Kept
+# here rather than imported from rfid_reader so that a wrong id there makes
+# the simulator reject ADD_ROSPEC the way a real reader does.
+IMPINJ_ROSPEC_SUBTYPES = {
+    50: 'ImpinjTagReportContentSelector',
+    52: 'ImpinjEnableRFPhaseAngle',
+    53: 'ImpinjEnablePeakRSSI',
+    67: 'ImpinjEnableRFDopplerFrequency',
+}
+# Impinj custom parameter subtypes a Speedway sends in TagReportData; encoded
+# here for the same reason, so the reader's parser is checked against them.
+IMPINJ_RF_PHASE_ANGLE = 56
+IMPINJ_RF_DOPPLER_FREQUENCY = 68
+
+def _timestamp_us(value: str) -> int:
+    """Capture timestamp as integer µs: float seconds, or an ISO datetime ('2025-04-17 13:31:08', ...T...)."""
+    try:
+        return int(float(value) * 1_000_000)
+    except ValueError:
+        return int(datetime.datetime.fromisoformat(value).timestamp() * 1_000_000)
+
+def _int_or_none(value: Optional[str]) -> Optional[int]:
+    return int(float(value)) if value else None
+
+def load_capture(path: str) -> List[Dict]:
+    """Load a Testing capture CSV as tag reads.
+
+    Handles the sllurp layout (timestamp, [reader,] antenna, rssi, epc, ...),
+    the Speedway Connect layout (antenna_port, epc, first_seen_timestamp,
+    peak_rssi, ...; no phase, channel or Doppler) and the RunTimestamp
+    layout (Timestamp, EPC, AntennaPort, RSSI, PhaseAngle in degrees,
+    Frequency, DopplerFrequency in Hz), converting the latter back to the
+    Impinj report units. Files without tag columns (e.g. run metadata) are
+    skipped with a warning.
+    """
+    reads = []
+    with open(path, newline='') as f:
+        rows = csv.DictReader(f, skipinitialspace=True)
+        columns = set(rows.fieldnames or ())
+        if 'Timestamp' in columns and 'EPC' in columns:
+            for row in rows:
+                reads.append({
+                    'timestamp_us': int(row['Timestamp']),
+                    'antenna': int(row.get('AntennaPort') or row['Antenna']),
+                    'rssi': round(float(row['RSSI'])),
+                    'epc': canonical_epc(row['EPC']),
+                    'phase_angle': round(float(row['PhaseAngle']) * 4096 / 360) % 4096,
+                    'channel_index': int(row['Frequency']),
+                    'doppler_frequency': round(float(row['DopplerFrequency']) * 16),
+                })
+        elif {'antenna_port', 'epc', 'peak_rssi'} <= columns:
+            for row in rows:
+                first_seen = row.get('first_seen_timestamp')
+                reads.append({
+                    'timestamp_us': int(first_seen) if first_seen else _timestamp_us(row['timestamp']),
+                    'antenna': int(row['antenna_port']),
+                    'rssi': round(float(row['peak_rssi'])),
+                    'epc': canonical_epc(row['epc']),
+                    'phase_angle': None,
+                    'channel_index': None,
+                    'doppler_frequency': None,
+                })
+        elif {'timestamp', 'antenna', 'rssi', 'epc'} <= columns:
+            for row in rows:
+                reads.append({
+                    'timestamp_us': _timestamp_us(row['timestamp']),
+                    'antenna': int(row['antenna']),
+                    'rssi': int(float(row['rssi'])),
+                    'epc': canonical_epc(row['epc']),
+                    'phase_angle': _int_or_none(row.get('phase_angle')),
+                    'channel_index': _int_or_none(row.get('channel_index')),
+                    'doppler_frequency': _int_or_none(row.get('doppler_frequency')),
+                })
+        else:
+            logger.warning(f"Skipping {path}: no tag read columns ({', '.join(rows.fieldnames or [])})")
+    return reads
+
+# State-unaware filter actions as (on match, on no match): True asserts the
+# tag's SL flag, False deasserts it, None leaves it alone
+FILTER_ACTIONS = {
+    0: (True, False),   # Select / Unselect
+    1: (True, None),    # Select / -
+    2: (None, False),   # - / Unselect
+    3: (False, None),   # Unselect / -
+    4: (False, True),   # Unselect / Select
+    5: (None, True),    # - / Select
+}
+
+def rospec_tag_masks(body: bytes) -> List[Tuple[int, bytes, int]]:
+    """(bit count, mask, action) of each EPC-bank C1G2 filter in an ADD_ROSPEC body.
+
+    Scans for the C1G2TagInventoryMask header rather than decoding the whole
+    ROSpec; a match must have a length consistent with its bit count. The
+    action comes from the C1G2TagInventoryStateUnawareFilterAction right
+    after it (0, select/unselect, if absent). The same filters repeat for
+    every antenna, so duplicates are dropped.
+    """
+    masks = []
+    header = struct.pack('>H', LLRP_PARAM_C1G2_TAG_INVENTORY_MASK)
+    action_header = struct.pack('>HH', LLRP_PARAM_C1G2_STATE_UNAWARE_FILTER_ACTION, 5)
+    pos = body.find(header)
+    while pos != -1 and pos + 9 <= len(body):
+        length, bank, pointer, bit_count = struct.unpack_from('>HBHH', body, pos + 2)
+        if length == 9 + (bit_count + 7) // 8 and bank >> 6 == EPC_BANK and pointer == EPC_BIT_POINTER:
+            end = pos + length
+            action = 0
+            if body[end:end + 4] == action_header and end + 5 <= len(body):
+                action = body[end + 4] >> FILTER_ACTION_SHIFT
+            mask = (bit_count, body[pos + 9:end], action)
+            if mask not in masks:
+                masks.append(mask)
+        pos = body.find(header, pos + 1)
+    return masks
+
+def keepalive_period_ms(body: bytes) -> int:
+    """Period of a periodic KeepaliveSpec in a SET_READER_CONFIG body (0 if absent or off)."""
+    pos = 1  # After the ResetToFactoryDefault byte
+    while pos + 4 <= len(body):
+        param_type, length = struct.unpack_from('>HH', body, pos)
+        if length < 4:
+            break
+        if param_type & 0x03FF == LLRP_PARAM_KEEPALIVE_SPEC and length >= 9:
+            trigger, period = struct.unpack_from('>BI', body, pos + 4)
+            return period if trigger == 1 else 0
+        pos += length
+    return 0
+
+def rospec_error(body: bytes) -> Optional[str]:
+    """Why a Speedway would reject this ADD_ROSPEC body, or None if it would accept it.
+
+    Scans for Impinj custom parameter headers (type 1023 followed by the
+    Impinj vendor id) and checks each subtype against IMPINJ_ROSPEC_SUBTYPES,
+    and rejects more than MAX_C1G2_FILTERS distinct C1G2 filters.
+    """
+    filters = len(rospec_tag_masks(body))
+    if filters > MAX_C1G2_FILTERS:
+        return f"{filters} C1G2 filters, at most {MAX_C1G2_FILTERS} supported"
+    vendor = struct.pack('>I', IMPINJ_VENDOR_ID)
+    pos = body.find(vendor)
+    while pos != -1:
+        param_type = struct.unpack_from('>H', body, pos - 4)[0] if pos >= 4 else None
+        if param_type is not None and param_type & 0x03FF == LLRP_PARAM_CUSTOM and pos + 8 <= len(body):
+            subtype = struct.unpack_from('>I', body, pos + 4)[0]
+            if subtype not in IMPINJ_ROSPEC_SUBTYPES:
+                return f"unsupported Impinj parameter subtype {subtype}"
+        pos = body.find(vendor, pos + 1)
+    return None
+
+def filters_select(epc: bytes, masks: List[Tuple[int, bytes, int]]) -> bool:
+    """True if a tag ends up selected (SL asserted) after applying `masks` in order, as Gen2 Select does."""
+    selected = False
+    for bit_count, mask, action in masks:
+        on_match, on_miss = FILTER_ACTIONS.get(action, (None, None))
+        change = on_match if mask_matches(epc, bit_count, mask) else on_miss
+        if change is not None:
+            selected = change
+    return selected
+
+def _status(code: int = 0) -> bytes:
+    return struct.pack('>HHHH', 287, 8, code, 0)  # LLRPStatus, empty ErrorDescription
+
+def _message(msg_type: int, msg_id: int, body: bytes) -> bytes:
+    return LLRP_HEADER.pack((1 << 10) | msg_type, LLRP_HEADER.size + len(body), msg_id) + body
+
+def connection_event() -> bytes:
+    """READER_EVENT_NOTIFICATION announcing a successful connection."""
+    utc = struct.pack('>HHQ', 128, 12, now_us())      # UTCTimestamp
+    attempt = struct.pack('>HHH', 256, 6, 0)           # ConnectionAttemptEvent: Success
+    data = struct.pack('>HH', 246, 4 + len(utc) + len(attempt)) + utc + attempt
+    return _message(LLRP_MSG_READER_EVENT_NOTIFICATION, 0, data)
+
+def capabilities_body(antennas: int) -> bytes:
+    """Recorded capabilities response body with MaxNumberOfAntennaSupported patched."""
+    with open(CAPS_FILE, 'rb') as f:
+        body = bytearray(f.read()[LLRP_HEADER.size:])
+    struct.pack_into('>H', body, 12, antennas)  # After LLRPStatus (8) and the GeneralDeviceCapabilities header
+    return bytes(body)
+
+def reader_config_body(antennas: int) -> bytes:
+    """Status plus one connected AntennaProperties per antenna."""
+    return _status() + b''.join(struct.pack('>HHBHh', 221, 9, 0x80, a, 0) for a in range(1, antennas + 1))
+
+def _impinj_report_params(phase_angle: Optional[int], doppler_frequency: Optional[int]) -> bytearray:
+    """ImpinjRFPhaseAngle / ImpinjRFDopplerFrequency custom parameters for one tag report."""
+    params = bytearray()
+    for subtype, fmt, value in ((IMPINJ_RF_PHASE_ANGLE, 'H', phase_angle),
+                                (IMPINJ_RF_DOPPLER_FREQUENCY, 'h', doppler_frequency)):
+        if value is not None:
+            params += struct.pack('>HHII' + fmt, LLRP_PARAM_CUSTOM, 12 + struct.calcsize(fmt),
+                                  IMPINJ_VENDOR_ID, subtype, value)
+    return params
+
+class ReportSource:
+    """Endless sequence of encoded TagReportData built from capture templates.
+
+    Each template is encoded once; per read only the EPC and the two
+    timestamps are patched in. With `population` set, template reads are
+    spread over that many synthetic EPCs (the last 4 bytes replaced by a
+    tag number) so the tag population is independent of the capture.
+    """
+
+    _TS_MARKER = 0x0102030405060708
+
+    def __init__(self, reads: List[Dict], population: Optional[int], antennas: int):
+        self.population = population
+        self.templates = []
+        for r in reads:
+            antenna = (r['antenna'] - 1) % antennas + 1
+            encoded = bytearray(build_tag_report_data(r['epc'], antenna, r['rssi'], self._TS_MARKER,
+                                                      r['channel_index']))
+            encoded += _impinj_report_params(r['phase_angle'], r['doppler_frequency'])
+            struct.pack_into('>H', encoded, 2, len(encoded))  # TagReportData length now covers them
+            marker = struct.pack('>Q', self._TS_MARKER)
+            first = encoded.find(marker)
+            last = encoded.find(marker, first + 8)
+            self.templates.append((encoded, first, last, bytes.fromhex(r['epc'])))
+        self._next = 0
+        self._tag = 0
+
+    def take(self, count: int, timestamp_us: int, spacing_us: int,
+             masks: List[Tuple[int, bytes, int]] = ()) -> Tuple[bytes, int]:
+        """Encode the next `count` reads, timestamped `spacing_us` apart from `timestamp_us`.
+
+        Reads that the C1G2 filters from the ROSpec (`masks`) leave unselected
+        are left out, as a filtering reader would never singulate them.
+        Returns the encoded TagReportData and how many reads it holds.
+        """
+        parts = []
+        templates = self.templates
+        for i in range(count):
+            template, first, last, epc = templates[self._next]
+            self._next = (self._next + 1) % len(templates)
+            synthetic = self.population and len(epc) == 12
+            if synthetic:
+                epc = epc[:8] + struct.pack('>I', self._tag)
+                self._tag = (self._tag + 1) % self.population
+            if masks and not filters_select(epc, masks):
+                continue
+            data = bytearray(template)
+            if synthetic:
+                data[5:17] = epc  # EPC-96 TV value follows the TLV header
+            ts = timestamp_us + i * spacing_us
+            struct.pack_into('>Q', data, first, ts)
+            struct.pack_into('>Q', data, last, ts)
+            parts.append(data)
+        return b''.join(parts), len(parts)
+
+class SimulatedReader:
+    """Serves one LLRP connection at a time per port, like a Speedway."""
+
+    def __init__(self, name: str, source: ReportSource, antennas: int, rate: float, tags_per_report: int):
+        self.name = name
+        self.source = source
+        self.antennas = antennas
+        self.rate = rate
+        self.tags_per_report = tags_per_report
+        self.caps = capabilities_body(antennas)
+        self.reads_sent = 0
+        self.tag_masks: List[Tuple[int, bytes, int]] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        logger.info(f"[{self.name}] Client connected from {peer}")
+        writer.write(connection_event())
+        stream = LLRPStream()
+        reports: Optional[asyncio.Task] = None
+        keepalives: Optional[asyncio.Task] = None
+        rospec_added = False
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                stream.feed(data)
+                for msg_type, msg_id, body in stream.messages():
+                    if msg_type in NO_RESPONSE:
+                        continue
+                    if msg_type == ADD_ROSPEC:
+                        error = rospec_error(bytes(body))
+                        if error:
+                            logger.warning(f"[{self.name}] Rejecting ADD_ROSPEC: {error}")
+                            writer.write(_message(RESPONSE_TYPES[msg_type], msg_id,
+                                                  _status(STATUS_UNSUPPORTED_PARAMETER)))
+                            continue
+                        rospec_added = True
+                        self.tag_masks = rospec_tag_masks(bytes(body))
+                        if self.tag_masks:
+                            logger.info(f"[{self.name}] Filtering on {len(self.tag_masks)} EPC mask(s)")
+                    if msg_type == LLRP_MSG_SET_READER_CONFIG:
+                        if keepalives is not None:
+                            keepalives.cancel()
+                            keepalives = None
+                        period_ms = keepalive_period_ms(bytes(body))
+                        if period_ms:
+                            keepalives = asyncio.create_task(self._send_keepalives(writer, period_ms / 1000))
+                    if msg_type in START_REPORTS and not rospec_added:
+                        writer.write(_message(RESPONSE_TYPES[msg_type], msg_id, _status(STATUS_NO_ROSPEC)))
+                        continue
+                    if msg_type == DELETE_ROSPEC:
+                        rospec_added = False
+                    writer.write(self._respond(msg_type, msg_id, bytes(body)))
+                    if msg_type in START_REPORTS and reports is None:
+                        reports = asyncio.create_task(self._stream_reports(writer))
+                    elif msg_type in STOP_REPORTS and reports is not None:
+                        reports.cancel()
+                        reports = None
+                    elif msg_type == LLRP_MSG_CLOSE_CONNECTION:
+                        await writer.drain()
+                        return
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"[{self.name}] Connection error: {e}")
+        finally:
+            for task in (reports, keepalives):
+                if task is not None:
+                    task.cancel()
+            writer.close()
+            logger.info(f"[{self.name}] Client {peer} disconnected, {self.reads_sent} reads sent so far")
+
+    def _respond(self, msg_type: int, msg_id: int, body: bytes) -> bytes:
+        if msg_type == LLRP_MSG_GET_READER_CAPABILITIES:
+            return _message(RESPONSE_TYPES[msg_type], msg_id, self.caps)
+        if msg_type == GET_READER_CONFIG:
+            return _message(RESPONSE_TYPES[msg_type], msg_id, reader_config_body(self.antennas))
+        if msg_type == LLRP_MSG_CUSTOM_MESSAGE and len(body) >= 9:
+            vendor, subtype = struct.unpack_from('>IB', body)
+            if vendor == IMPINJ_VENDOR_ID:
+                # Impinj responses use the next subtype (e.g. ENABLE_EXTENSIONS 21 -> 22)
+                return _message(msg_type, msg_id, struct.pack('>IBI', vendor, subtype + 1, 0) + _status())
+        if msg_type in RESPONSE_TYPES:
+            return _message(RESPONSE_TYPES[msg_type], msg_id, _status())
+        logger.debug(f"[{self.name}] Unsupported message type {msg_type}")
+        return _message(LLRP_MSG_ERROR_MESSAGE, msg_id, _status(STATUS_UNSUPPORTED_MESSAGE))
+
+    async def _send_keepalives(self, writer: asyncio.StreamWriter, period: float):
+        """Send a KEEPALIVE every `period` seconds, as a reader with a periodic KeepaliveSpec does."""
+        msg_id = 0
+        while True:
+            await asyncio.sleep(period)
+            msg_id = (msg_id + 1) & 0xFFFFFFFF
+            writer.write(_message(LLRP_MSG_KEEPALIVE, msg_id, b''))
+            await writer.drain()
+
+    async def _stream_reports(self, writer: asyncio.StreamWriter):
+        """Send RO_ACCESS_REPORTs of `tags_per_report` reads at `rate` reads/s."""
+        per_report = self.tags_per_report
+        interval = per_report / self.rate
+        spacing_us = max(1, int(1_000_000 / self.rate))
+        next_send = time.monotonic()
+        report_id = 0
+        while True:
+            report_id = (report_id + 1) & 0xFFFFFFFF
+            body, reads = self.source.take(per_report, now_us(), spacing_us, self.tag_masks)
+            if reads:
+                writer.write(_message(LLRP_MSG_RO_ACCESS_REPORT, report_id, body))
+                self.reads_sent += reads
+                await writer.drain()
+            next_send += interval
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -1.0:
+                next_send = time.monotonic()  # Fell too far behind; don't burst to catch up
+
+class SimulatedConnectSocket:
+    """Stand-in for Speedway Connect's socket output: one line per tag read to every client.
+
+    Lines carry SOCKET_FIELDS in order, paced at `rate` reads/s in ~10 ms
+    chunks, with the read's antenna folded onto `antennas` like the LLRP
+    side and first_seen_timestamp set to the send time.
+    """
+
+    def __init__(self, name: str, reads: List[Dict], antennas: int, rate: float):
+        self.name = name
+        self.rate = rate
+        self.rows = [{'antenna_port': str((r['antenna'] - 1) % antennas + 1), 'epc': r['epc'].upper(),
+                      'peak_rssi': str(r['rssi'])} for r in reads]
+        self.reads_sent = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        logger.info(f"[{self.name}] Socket client connected from {peer}")
+        chunk = max(1, round(self.rate / 100))
+        interval = chunk / self.rate
+        spacing_us = max(1, int(1_000_000 / self.rate))
+        next_send = time.monotonic()
+        i = 0
+        try:
+            while True:
+                ts = now_us()
+                lines = []
+                for n in range(chunk):
+                    row = dict(self.rows[i], first_seen_timestamp=str(ts + n * spacing_us))
+                    i = (i + 1) % len(self.rows)
+                    lines.append(','.join(f'"{row[f]}"' if f == 'epc' else row.get(f, '') for f in SOCKET_FIELDS))
+                writer.write(('\r\n'.join(lines) + '\r\n').encode('ascii'))
+                self.reads_sent += chunk
+                await writer.drain()
+                next_send += interval
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -1.0:
+                    next_send = time.monotonic()  # Fell too far behind; don't burst to catch up
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            logger.info(f"[{self.name}] Socket client {peer} disconnected, {self.reads_sent} reads sent so far")
+
+def native_rate(reads: List[Dict]) -> float:
+    """Reads per second in the original capture."""
+    span_us = max(r['timestamp_us'] for r in reads) - min(r['timestamp_us'] for r in reads)
+    return len(reads) / (span_us / 1e6) if span_us > 0 else 100.0
+
+async def serve(args, reads: List[Dict]):
+    rate = args.rate or native_rate(reads) * args.speedup
+    servers = []
+    for i in range(args.readers):
+        port = args.port + i
+        sim = SimulatedReader(f"sim-{port}", ReportSource(reads, args.tags, args.antennas),
+                              args.antennas, rate, args.tags_per_report)
+        servers.append(await asyncio.start_server(sim.handle, args.host, port))
+        logger.info(f"Simulated reader listening on {args.host}:{port}: {rate:.0f} reads/s, "
+                    f"{args.antennas} antennas, {args.tags or 'capture'} tags, {args.tags_per_report} tags/report")
+    if args.connect_socket_port:
+        sim = SimulatedConnectSocket(f"connect-{args.connect_socket_port}", reads, args.antennas, rate)
+        servers.append(await asyncio.start_server(sim.handle, args.host, args.connect_socket_port))
+        logger.info(f"Speedway Connect socket stand-in listening on {args.host}:{args.connect_socket_port}: "
+                    f"{rate:.0f} reads/s")
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in LLRP reader that replays Testing captures as RO_ACCESS_REPORTs")
+    parser.add_argument('--capture', action='append',
+                        help='Capture CSV or glob (repeatable), e.g. "Testing/Test8/*.csv"; default Test8 (1,1)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=5084, help='LLRP port (first port with --readers)')
+    parser.add_argument('--readers', type=int, default=1, help='Simulate this many readers on consecutive ports')
+    parser.add_argument('--tags', type=int, help='Synthetic tag population (default: the EPCs in the capture)')
+    parser.add_argument('--antennas', type=int, default=4, help='Antenna count; capture antennas are folded onto it')
+    parser.add_argument('--rate', type=float, help='Reads per second per reader (default: capture rate x --speedup)')
+    parser.add_argument('--speedup', type=float, default=1.0, help='Multiple of the capture\'s own read rate')
+    parser.add_argument('--tags-per-report', type=int, default=1, help='TagReportData per RO_ACCESS_REPORT')
+    parser.add_argument('--connect-socket-port', type=int, metavar='PORT',
+                        help='Also serve the capture as Speedway Connect socket output on this port (reader uses 14150)')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    paths = []
+    for pattern in args.capture or [DEFAULT_CAPTURE]:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    reads = [read for path in paths for read in load_capture(path)]
+    if not reads:
+        parser.error("No reads found in the capture files")
+    logger.info(f"Loaded {len(reads)} template reads from {len(paths)} file(s)")
+    try:
+        asyncio.run(serve(args, reads))
+    except KeyboardInterrupt:
+        logger.info("Simulator stopped")
+
+if __name__ == '__main__':
+    main()
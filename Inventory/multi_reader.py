@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import signal
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from rfid_reader import (CAPABILITIES_REQUEST, LLRP_MSG_KEEPALIVE, LLRP_MSG_KEEPALIVE_ACK,
+                         LLRP_MSG_RO_ACCESS_REPORT, MAX_EPC_FILTERS, READER_SETTINGS, LLRPStream,
+                         apply_capabilities, check_setup_results, collect_responses, connection_accepted,
+                         create_llrp_message, link_timeout, parse_ro_access_report, pipeline_messages,
+                         reader_capabilities, reconnect_delay, running, setup_requests, stats, tag_queue,
+                         writer_thread)
+from batch_queue import OVERFLOW_POLICIES
+from epc import epc_mask
+from tag_batch import TagReadBatch, reader_table
+from tag_sink import add_sink_arguments, open_sink_from_args
+
+logger = logging.getLogger('multi_reader')
+
+DEFAULT_PORT = 5084
+
+class ReaderHealth:
+    """Connection state and running counters for one reader."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = 'idle'  # connecting, configuring, streaming, backoff
+        self.connects = 0
+        self.failures = 0
+        self.reads = 0
+        self.reports = 0
+        self.bytes = 0
+        self.last_report: Optional[float] = None  # time.monotonic() of the latest RO_ACCESS_REPORT
+        self.time_to_first_tag_ms: Optional[float] = None
+        self.last_error = ''
+
+    def snapshot(self):
+        return self.reads, self.reports, self.bytes
+
+class StreamMerger:
+    """Merge per-reader batches into one stream ordered by read timestamp.
+
+    Reads are held until every reader that has reported within `window_s`
+    has moved past them (a k-way merge watermark), so output is in timestamp
+    order as long as no reader's reports arrive more than one window late.
+    Readers that go quiet stop holding the others back. Each read's arrival
+    time is kept alongside it, and a read held for more than two windows is
+    emitted on the next drain whatever the watermark, which bounds latency
+    if reader clocks disagree; such reads may come out of order.
+    """
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._pending = TagReadBatch()
+        self._arrived: List[float] = []         # time.monotonic() each pending read was added
+        self._latest: Dict[int, int] = {}       # reader id -> newest timestamp seen
+        self._last_seen: Dict[int, float] = {}  # reader id -> time.monotonic() of last batch
+
+    def add(self, reader_id: int, batch: TagReadBatch):
+        now = time.monotonic()
+        self._pending.extend(batch)
+        self._arrived.extend([now] * len(batch))
+        newest = max(batch.timestamp_us)
+        if newest > self._latest.get(reader_id, 0):
+            self._latest[reader_id] = newest
+        self._last_seen[reader_id] = now
+
+    def drain(self, flush_all: bool = False) -> TagReadBatch:
+        """Remove and return the reads that are safe to emit, sorted by timestamp."""
+        pending = self._pending
+        if not pending:
+            return pending
+        now = time.monotonic()
+        active = [latest for reader_id, latest in self._latest.items()
+                  if now - self._last_seen[reader_id] <= self.window_s]
+        timestamps = pending.timestamp_us
+        arrived = self._arrived
+        if flush_all or not active or now - arrived[-1] > 2 * self.window_s:
+            ready, held = range(len(pending)), []
+        else:
+            watermark = min(active)
+            overdue = now - 2 * self.window_s
+            ready, held = [], []
+            for i, ts in enumerate(timestamps):
+                (ready if ts <= watermark or arrived[i] < overdue else held).append(i)
+        out = pending.select(sorted(ready, key=timestamps.__getitem__))
+        self._pending = pending.select(held) if held else TagReadBatch()
+        self._arrived = [arrived[i] for i in held]
+        return out
+
+class ReaderConnection:
+    """One reader's LLRP session on the event loop, reconnecting with backoff."""
+
+    def __init__(self, name: str, ip: str, port: int, settings: Dict, merger: StreamMerger):
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.settings = settings
+        self.merger = merger
+        self.reader_id = reader_table.intern(name)
+        self.health = ReaderHealth(name)
+        self._stream: Optional[LLRPStream] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def run(self):
+        while running.is_set():
+            connect_start = time.perf_counter()
+            try:
+                await self._connect()
+                self.health.failures = 0
+                await self._stream_reports(connect_start)
+                self.health.last_error = 'reader closed connection'
+            except (OSError, ValueError, RuntimeError, asyncio.TimeoutError) as e:
+                self.health.last_error = str(e) or type(e).__name__
+                logger.warning(f"[{self.name}] Connection error: {self.health.last_error}")
+            finally:
+                self._close()
+            if running.is_set():
+                delay = reconnect_delay(self.health.failures)
+                self.health.failures += 1
+                self.health.state = 'backoff'
+                logger.info(f"[{self.name}] Reconnecting in {delay:.2f} seconds (attempt {self.health.failures})")
+                await asyncio.sleep(delay)
+
+    async def _fill(self):
+        data = await self._reader.read(65536)
+        if not data:
+            raise ConnectionResetError("Reader closed connection")
+        self._stream.feed(data)
+        self.health.bytes += len(data)
+        stats.bytes += len(data)
+
+    async def _pipeline(self, requests) -> Dict[str, Dict]:
+        data, pending = pipeline_messages(requests)
+        self._writer.write(data)
+        await self._writer.drain()
+        results = {}
+        while pending:
+            collect_responses(self._stream, pending, results)
+            if pending:
+                await self._fill()
+        return results
+
+    async def _connect(self):
+        self.health.state = 'connecting'
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.ip, self.port), 5.0)
+        self._writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = LLRPStream()
+        while not connection_accepted(self._stream):
+            await asyncio.wait_for(self._fill(), 5.0)
+        self.health.connects += 1
+        self.health.state = 'configuring'
+
+        key = (self.ip, self.port)
+        capabilities = reader_capabilities.get(key)
+        if capabilities is None:
+            status = (await self._pipeline(CAPABILITIES_REQUEST))['GET_READER_CAPABILITIES']
+            capabilities = reader_capabilities[key] = status['capabilities']
+            logger.info(f"[{self.name}] Reader capabilities: {capabilities}")
+        settings = apply_capabilities(self.settings, capabilities)
+        check_setup_results(await asyncio.wait_for(self._pipeline(setup_requests(settings)), 10.0))
+        self.health.state = 'streaming'
+        logger.info(f"[{self.name}] Configured: antennas={settings['antennas']}")
+
+    async def _stream_reports(self, connect_start: float):
+        first_tag_pending = True
+        health = self.health
+        dead_after = link_timeout(self.settings)
+        while running.is_set():
+            for msg_type, msg_id, body in self._stream.messages():
+                if msg_type == LLRP_MSG_RO_ACCESS_REPORT:
+                    reads = parse_ro_access_report(body)
+                    health.reports += 1
+                    health.last_report = time.monotonic()
+                    stats.reports += 1
+                    if not reads:
+                        continue
+                    reads.set_reader(self.reader_id)
+                    health.reads += len(reads)
+                    stats.reads += len(reads)
+                    if first_tag_pending:
+                        first_tag_pending = False
+                        health.time_to_first_tag_ms = (time.perf_counter() - connect_start) * 1000
+                        logger.info(f"[{self.name}] Time to first tag: {health.time_to_first_tag_ms:.0f} ms")
+                    self.merger.add(self.reader_id, reads)
+                elif msg_type == LLRP_MSG_KEEPALIVE:
+                    self._writer.write(create_llrp_message(LLRP_MSG_KEEPALIVE_ACK, b''))
+            try:
+                # Reports or keepalives should arrive at least every keepalive period
+                await asyncio.wait_for(self._fill(), dead_after)
+            except asyncio.TimeoutError:
+                raise ConnectionResetError(f"No messages from reader for {dead_after:g} s") from None
+
+    def _close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+async def merge_task(merger: StreamMerger, stop: asyncio.Event):
+    """Hand merged, time-ordered batches to the writer thread's queue."""
+    interval = max(merger.window_s / 4, 0.01)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        batch = merger.drain(flush_all=stop.is_set())
+        if batch:
+            await asyncio.to_thread(tag_queue.put, batch)  # May block under the 'block' overflow policy
+
+async def stats_task(connections: List[ReaderConnection], interval: float, stop: asyncio.Event):
+    """Log one aggregate line plus one health line per reader every `interval` seconds."""
+    last = {c.name: c.health.snapshot() for c in connections}
+    last_time = time.monotonic()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        now = time.monotonic()
+        elapsed = max(now - last_time, 1e-6)
+        ring = tag_queue.metrics()
+        streaming = sum(1 for c in connections if c.health.state == 'streaming')
+        logger.info(f"{streaming}/{len(connections)} readers streaming, total reads {stats.reads}, "
+                    f"queue depth {ring['depth']} (high water {ring['high_water']}), dropped {ring['dropped']}, "
+                    f"writer lag {ring['lag_ms']:.0f} ms")
+        for c in connections:
+            h = c.health
+            reads, reports, nbytes = (cur - prev for cur, prev in zip(h.snapshot(), last[c.name]))
+            idle = f"{now - h.last_report:.1f}s ago" if h.last_report else 'never'
+            ttft = f"{h.time_to_first_tag_ms:.0f} ms" if h.time_to_first_tag_ms is not None else '-'
+            logger.info(f"  {h.name}: {h.state}, {reads / elapsed:.0f} reads/s, {reports / elapsed:.0f} reports/s, "
+                        f"{nbytes / elapsed / 1024:.1f} KiB/s, last report {idle}, first tag {ttft}, "
+                        f"connects {h.connects}" + (f", last error: {h.last_error}" if h.last_error else ''))
+            last[c.name] = h.snapshot()
+        last_time = now
+
+async def run_readers(readers: List[Dict], duration: Optional[float], window_s: float, stats_interval: float):
+    """Run every configured reader until `duration` elapses or SIGINT."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    if duration:
+        loop.call_later(duration, stop.set)
+
+    merger = StreamMerger(window_s)
+    connections = [ReaderConnection(r['id'], r['ip'], r['port'], r['settings'], merger) for r in readers]
+    reader_tasks = [asyncio.create_task(c.run(), name=f"reader-{c.name}") for c in connections]
+    merger_t = asyncio.create_task(merge_task(merger, stop))
+    helpers = [merger_t]
+    if stats_interval > 0:
+        helpers.append(asyncio.create_task(stats_task(connections, stats_interval, stop)))
+
+    await stop.wait()
+    logger.info("Stopping readers")
+    for task in reader_tasks:
+        task.cancel()
+    await asyncio.gather(*reader_tasks, return_exceptions=True)
+    for c in connections:
+        c._close()
+    await asyncio.gather(*helpers)  # merge_task does a final flush once stop is set
+
+def load_readers(config_path: Optional[str], reader_args: List[str]) -> List[Dict]:
+    """Reader list from a JSON config and/or --reader ID=IP[:PORT] arguments.
+
+    The config looks like {"settings": {...}, "readers": [{"id": "dock-1",
+    "ip": "192.168.0.219", "port": 5084, "antennas": [1, 2]}, ...]}; top-level
+    settings and any per-reader keys override READER_SETTINGS, e.g.
+    "epc_filters": ["3034"] for a reader-side EPC prefix filter.
+    """
+    common, entries = {}, []
+    if config_path:
+        with open(config_path) as f:
+            config = json.load(f)
+        common = config.get('settings', {})
+        entries = list(config.get('readers', []))
+    for arg in reader_args:
+        name, _, address = arg.partition('=')
+        if not address:
+            name, address = arg, arg
+        ip, _, port = address.partition(':')
+        entries.append({'id': name, 'ip': ip, 'port': int(port) if port else DEFAULT_PORT})
+
+    readers = []
+    for entry in entries:
+        entry = dict(entry)
+        ip = entry.pop('ip')
+        port = int(entry.pop('port', DEFAULT_PORT))
+        name = entry.pop('id', f"{ip}:{port}")
+        settings = dict(READER_SETTINGS, **common, **entry)
+        if len(settings['epc_filters']) > MAX_EPC_FILTERS:
+            raise ValueError(f"Reader {name}: at most {MAX_EPC_FILTERS} epc_filters are supported, "
+                             f"got {len(settings['epc_filters'])}")
+        for prefix in settings['epc_filters']:
+            epc_mask(prefix)  # Reject a bad filter now rather than on every reconnect
+        readers.append({'id': name, 'ip': ip, 'port': port, 'settings': settings})
+    names = [r['id'] for r in readers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Reader IDs must be unique: {names}")
+    return readers
+
+def main():
+    parser = argparse.ArgumentParser(description="Read from many LLRP readers in one process")
+    parser.add_argument('--config', help='JSON file listing readers and shared settings')
+    parser.add_argument('--reader', action='append', default=[], metavar='ID=IP[:PORT]',
+                        help='Add a reader (repeatable)')
+    parser.add_argument('--duration', type=float, help='Run duration in seconds')
+    parser.add_argument('--reorder-window-ms', type=float, default=500,
+                        help='How long reads are held to merge the readers into timestamp order')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level')
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help='Seconds between per-reader health lines (0 to disable)')
+    parser.add_argument('--queue-capacity', type=int, default=100_000,
+                        help='Maximum tag reads buffered ahead of the writer thread')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='What to do when the buffer is full')
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    try:
+        readers = load_readers(args.config, args.reader)
+    except ValueError as e:
+        parser.error(str(e))
+    if not readers:
+        parser.error("No readers configured; use --config or --reader")
+    logger.info(f"Starting {len(readers)} readers: {', '.join(r['id'] for r in readers)}")
+    tag_queue.configure(args.queue_capacity, args.overflow)
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    sink = open_sink_from_args(args, f'rfid_reads_{timestamp}')
+
+    running.set()
+    writer_t = threading.Thread(target=writer_thread, args=(sink,))
+    writer_t.start()
+    try:
+        asyncio.run(run_readers(readers, args.duration, args.reorder_window_ms / 1000, args.stats_interval))
+    finally:
+        tag_queue.close()
+        running.clear()
+        writer_t.join()
+    logger.info("Script finished")
+
+if __name__ == '__main__':
+    main()
@@ -2,51 +2,201 @@ import socket
 import struct
 import queue
 import threading
-import csv
 import time
 import datetime
 import argparse
+import itertools
+import random
+import logging
 import signal
 import sys
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from batch_queue import OVERFLOW_POLICIES, BatchRing
+from epc import EPC_BANK, EPC_BIT_POINTER, epc_mask
+from llrp_capture import CaptureWriter
+from tag_batch import TAG_READ_FIELDS, TagReadBatch, format_timestamp_us, reader_table
+from tag_sink import TagSink, add_sink_arguments, open_sink_from_args
 
 # LLRP message types
+LLRP_MSG_GET_READER_CAPABILITIES = 1
+LLRP_MSG_SET_READER_CONFIG = 3
+LLRP_MSG_CLOSE_CONNECTION_RESPONSE = 4
+LLRP_MSG_GET_READER_CAPABILITIES_RESPONSE = 11
+LLRP_MSG_SET_READER_CONFIG_RESPONSE = 13
 LLRP_MSG_CLOSE_CONNECTION = 14
-LLRP_MSG_GET_READER_CAPABILITIES = 103
-LLRP_MSG_SET_READER_CONFIG = 101
-LLRP_MSG_DELETE_ALL_ROSPECS = 22
 LLRP_MSG_ADD_ROSPEC = 20
+LLRP_MSG_DELETE_ROSPEC = 21
 LLRP_MSG_ENABLE_ROSPEC = 24
-LLRP_MSG_RO_ACCESS_REPORT = 201
+LLRP_MSG_ADD_ROSPEC_RESPONSE = 30
+LLRP_MSG_DELETE_ROSPEC_RESPONSE = 31
+LLRP_MSG_ENABLE_ROSPEC_RESPONSE = 34
+LLRP_MSG_RO_ACCESS_REPORT = 61
+LLRP_MSG_KEEPALIVE = 62
+LLRP_MSG_READER_EVENT_NOTIFICATION = 63
+LLRP_MSG_KEEPALIVE_ACK = 72
+LLRP_MSG_ERROR_MESSAGE = 100
+LLRP_MSG_CUSTOM_MESSAGE = 1023
+
+# Messages the reader sends on its own rather than in response to a request
+UNSOLICITED_MESSAGES = (LLRP_MSG_RO_ACCESS_REPORT, LLRP_MSG_KEEPALIVE, LLRP_MSG_READER_EVENT_NOTIFICATION)
+
+# Reconnect backoff (seconds)
+RECONNECT_BASE_DELAY = 0.25
+RECONNECT_MAX_DELAY = 10.0
+
+# LLRP message header: Rsvd/Ver/Type (16 bits), Length (32 bits), ID (32 bits)
+LLRP_HEADER = struct.Struct('>HII')
+LLRP_HEADER_LEN = LLRP_HEADER.size  # 10 bytes
+LLRP_MAX_MESSAGE_LEN = 16 * 1024 * 1024  # Sanity bound on the length field
 
 # Global variables
-tag_queue = queue.Queue()
+tag_queue = BatchRing()  # Bounded; see --queue-capacity / --overflow
 running = threading.Event()
 reader_socket = None
+reader_capabilities: Dict[Tuple[str, int], Dict] = {}  # Cached per (ip, port) across reconnects
+_msg_ids = itertools.count(1)
+raw_capture: Optional[CaptureWriter] = None  # Set by --capture-raw
+
+logger = logging.getLogger('rfid_reader')
+# Per-read tracing goes to its own logger so it can be enabled independently
+read_logger = logging.getLogger('rfid_reader.reads')
+
+class ReadTracer:
+    """Optional per-read debug output, sampled 1-in-N; a no-op unless enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_every = 1
+        self._count = 0
+
+    def configure(self, enabled: bool, sample_every: int = 1):
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        read_logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
+
+    def trace(self, batch: TagReadBatch):
+        for row in batch.rows():
+            self._count += 1
+            if self._count % self.sample_every == 0:
+                read = dict(zip(TAG_READ_FIELDS, row))
+                read['timestamp_us'] = format_timestamp_us(row[0])
+                read_logger.debug(f"Tag read #{self._count}: {read}")
 
-def create_llrp_message(msg_type: int, data: bytes) -> bytes:
+class IngestStats:
+    """Running counters for the periodic summary line."""
+
+    def __init__(self):
+        self.reads = 0
+        self.reports = 0
+        self.bytes = 0
+        self.written = 0
+        self.reconnects = 0
+        self.time_to_first_tag_ms: Optional[float] = None  # Measured after the latest (re)connect
+
+    def snapshot(self) -> Tuple[int, int, int, int]:
+        return self.reads, self.reports, self.bytes, self.written
+
+read_tracer = ReadTracer()
+stats = IngestStats()
+
+def create_llrp_message(msg_type: int, data: bytes, msg_id: Optional[int] = None) -> bytes:
     """Create an LLRP message with header and data."""
     version = 1
-    msg_id = int(time.time() * 1000) % 2**32
-    length = 10 + len(data)  # Header (10 bytes) + data
-    header = struct.pack('>HHI', (version << 10) | msg_type, length, msg_id)
-    print(f"{datetime.datetime.now()}: Creating LLRP message: type={msg_type}, length={length}, id={msg_id}")
+    if msg_id is None:
+        msg_id = next(_msg_ids)
+    msg_id &= 0xFFFFFFFF
+    length = LLRP_HEADER_LEN + len(data)  # Header (10 bytes) + data
+    header = LLRP_HEADER.pack((version << 10) | msg_type, length, msg_id)
+    logger.debug(f"Creating LLRP message: type={msg_type}, length={length}, id={msg_id}")
     return header + data
 
-def parse_llrp_response(data: bytes) -> Dict:
-    """Parse an LLRP response message for status."""
-    print(f"{datetime.datetime.now()}: Parsing LLRP response: {len(data)} bytes, raw={data.hex()}")
-    if len(data) < 10:
-        print(f"{datetime.datetime.now()}: Invalid response: too short")
-        return {'status': 'Invalid response', 'msg_type': 0, 'error_msg': '', 'capabilities': {}}
-    msg_type = struct.unpack('>H', data[0:2])[0] & 0x03FF
+class LLRPStream:
+    """Reassemble complete LLRP messages from a TCP byte stream.
+
+    The reader is free to coalesce several messages into one TCP segment or
+    split one message across segments, so socket reads are accumulated in a
+    single preallocated buffer and messages are cut out of it using the length
+    field of the 10-byte header. Message bodies are returned as memoryview
+    slices of that buffer; they are only valid until the next fill()/feed().
+    """
+
+    def __init__(self, bufsize: int = 65536):
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._start = 0  # First unconsumed byte
+        self._end = 0    # One past the last received byte
+        self.tap: Optional[Callable[[memoryview], None]] = None  # Sees every received chunk (raw capture)
+
+    def pending(self) -> int:
+        """Number of buffered bytes not yet returned as a complete message."""
+        return self._end - self._start
+
+    def _reserve(self, size: int):
+        """Make room for at least `size` more bytes after the buffered data."""
+        pending = self._end - self._start
+        if pending == 0:
+            self._start = self._end = 0
+        if len(self._buf) - self._end >= size:
+            return
+        if pending + size <= len(self._buf):
+            # Slide the partial message to the front (same-size slice copy)
+            self._buf[0:pending] = self._buf[self._start:self._end]
+        else:
+            # Grow into a new buffer so earlier views stay valid
+            new_buf = bytearray(max(len(self._buf) * 2, pending + size))
+            new_buf[0:pending] = self._view[self._start:self._end]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+        self._start, self._end = 0, pending
+
+    def fill(self, sock: socket.socket) -> int:
+        """Receive from `sock` straight into the buffer; returns 0 on EOF."""
+        self._reserve(4096)
+        n = sock.recv_into(self._view[self._end:])
+        if self.tap and n:
+            self.tap(self._view[self._end:self._end + n])
+        self._end += n
+        return n
+
+    def feed(self, data: bytes):
+        """Append bytes that were received by some other means."""
+        self._reserve(len(data))
+        self._view[self._end:self._end + len(data)] = data
+        if self.tap and data:
+            self.tap(data)
+        self._end += len(data)
+
+    def messages(self) -> Iterator[Tuple[int, int, memoryview]]:
+        """Yield (msg_type, msg_id, body) for every complete buffered message."""
+        while self._end - self._start >= LLRP_HEADER_LEN:
+            type_field, length, msg_id = LLRP_HEADER.unpack_from(self._buf, self._start)
+            if length < LLRP_HEADER_LEN or length > LLRP_MAX_MESSAGE_LEN:
+                raise ValueError(f"Invalid LLRP message length {length}, stream out of sync")
+            if self._end - self._start < length:
+                # Partial message; make sure the buffer can hold all of it
+                self._reserve(length - (self._end - self._start))
+                return
+            body = self._view[self._start + LLRP_HEADER_LEN:self._start + length]
+            self._start += length
+            yield type_field & 0x03FF, msg_id, body
+
+def parse_llrp_response(msg_type: int, data) -> Dict:
+    """Parse the body of an LLRP response message for status and capabilities."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Parsing LLRP response: type={msg_type}, {len(data)} bytes, raw={data.hex()}")
+    data = bytes(data)
     status = 'Unknown'
     error_msg = ''
     capabilities = {}
-    pos = 10
-    while pos < len(data):
-        param_type = struct.unpack('>H', data[pos:pos+2])[0]
-        param_length = struct.unpack('>H', data[pos+2:pos+4])[0]
+    pos = 0
+    if msg_type == LLRP_MSG_CUSTOM_MESSAGE:
+        pos = 9  # VendorIdentifier (u32), MessageSubtype (u8), Reserved (u32)
+    while pos + 4 <= len(data):
+        param_type, param_length = _TLV_HEADER.unpack_from(data, pos)
+        param_type &= 0x03FF
+        if param_length < 4:
+            break
         if param_type == 287:  # LLRPStatus
             status_code = struct.unpack('>H', data[pos+4:pos+6])[0]
             status = 'Success' if status_code == 0 else f'Error {status_code}'
@@ -54,363 +204,752 @@ def parse_llrp_response(data: bytes) -> Dict:
                 error_len = struct.unpack('>H', data[pos+6:pos+8])[0]
                 if error_len > 0:
                     error_msg = data[pos+8:pos+8+error_len].decode('utf-8', errors='ignore')
-            print(f"{datetime.datetime.now()}: Found LLRPStatus: {status}, error_msg={error_msg}")
-        elif param_type == 143:  # GeneralDeviceCapabilities
-            if param_length > 12:
-                max_antennas = struct.unpack('>H', data[pos+12:pos+14])[0]
-                capabilities['max_antennas'] = max_antennas
-                device_name_len = struct.unpack('>H', data[pos+4:pos+6])[0]
-                if device_name_len > 0 and pos+6+device_name_len <= len(data):
-                    device_name = data[pos+6:pos+6+device_name_len].decode('utf-8', errors='ignore')
-                    capabilities['device_name'] = device_name
-                    print(f"{datetime.datetime.now()}: Found GeneralDeviceCapabilities: max_antennas={max_antennas}, device_name={device_name}")
-        elif param_type == 246:  # Vendor-specific parameter
-            param_data = data[pos+4:pos+param_length]
-            print(f"{datetime.datetime.now()}: Vendor-specific parameter type 246, length={param_length}, data={param_data.hex()}")
-            error_msg += f"Vendor-specific error (type 246): {param_data.hex()}"
-            if param_length > 4:
-                try:
-                    error_code = struct.unpack('>I', param_data[0:4])[0]
-                    print(f"{datetime.datetime.now()}: Possible vendor error code: {error_code}")
-                    error_msg += f", possible error code: {error_code}"
-                except:
-                    pass
-                try:
-                    error_str = param_data[4:].decode('utf-8', errors='ignore')
-                    if error_str:
-                        print(f"{datetime.datetime.now()}: Possible vendor error string: {error_str}")
-                        error_msg += f", possible error string: {error_str}"
-                except:
-                    pass
+            logger.debug(f"Found LLRPStatus: {status}, error_msg={error_msg}")
+        elif param_type == 137:  # GeneralDeviceCapabilities
+            max_antennas, _, manufacturer, model, fw_len = struct.unpack('>HHIIH', data[pos+4:pos+18])
+            capabilities['max_antennas'] = max_antennas
+            capabilities['manufacturer'] = manufacturer
+            capabilities['model'] = model
+            capabilities['firmware'] = data[pos+18:pos+18+fw_len].decode('utf-8', errors='ignore')
+            logger.debug(f"Found GeneralDeviceCapabilities: {capabilities}")
         else:
-            print(f"{datetime.datetime.now()}: Unknown parameter type {param_type}, length={param_length}")
+            logger.debug(f"Unhandled parameter type {param_type}, length={param_length}")
         pos += param_length
     return {'msg_type': msg_type, 'status': status, 'error_msg': error_msg, 'capabilities': capabilities}
 
-def parse_ro_access_report(data: bytes) -> List[Dict]:
-    """Parse an RO_ACCESS_REPORT message into a list of tag reads."""
-    print(f"{datetime.datetime.now()}: Parsing RO_ACCESS_REPORT: {len(data)} bytes")
-    reads = []
+def parse_connection_event(data) -> Optional[int]:
+    """Return the ConnectionAttemptEvent status from a READER_EVENT_NOTIFICATION body, if present."""
+    end = len(data)
+    if end < 4 or _TLV_HEADER.unpack_from(data, 0)[0] & 0x03FF != 246:  # ReaderEventNotificationData
+        return None
+    pos = 4
+    while pos + 4 <= end:
+        param_type, param_length = _TLV_HEADER.unpack_from(data, pos)
+        if param_length < 4:
+            break
+        if param_type & 0x03FF == 256:  # ConnectionAttemptEvent
+            return _U16.unpack_from(data, pos + 4)[0]
+        pos += param_length
+    return None
+
+# LLRP parameter types used in RO_ACCESS_REPORT (TLV-encoded)
+LLRP_PARAM_TAG_REPORT_DATA = 240
+LLRP_PARAM_EPC_DATA = 241
+LLRP_PARAM_CUSTOM = 1023
+
+# TV-encoded parameters: type -> value length in bytes (after the 1-byte type)
+LLRP_TV_ANTENNA_ID = 1
+LLRP_TV_FIRST_SEEN_UTC = 2
+LLRP_TV_FIRST_SEEN_UPTIME = 3
+LLRP_TV_LAST_SEEN_UTC = 4
+LLRP_TV_LAST_SEEN_UPTIME = 5
+LLRP_TV_PEAK_RSSI = 6
+LLRP_TV_CHANNEL_INDEX = 7
+LLRP_TV_TAG_SEEN_COUNT = 8
+LLRP_TV_EPC_96 = 13
+LLRP_TV_LENGTHS = {
+    1: 2,    # AntennaID
+    2: 8,    # FirstSeenTimestampUTC
+    3: 8,    # FirstSeenTimestampUptime
+    4: 8,    # LastSeenTimestampUTC
+    5: 8,    # LastSeenTimestampUptime
+    6: 1,    # PeakRSSI
+    7: 2,    # ChannelIndex
+    8: 2,    # TagSeenCount
+    9: 4,    # ROSpecID
+    10: 2,   # InventoryParameterSpecID
+    11: 2,   # C1G2-CRC
+    12: 2,   # C1G2-PC
+    13: 12,  # EPC-96
+    14: 2,   # SpecIndex
+    15: 2,   # ClientRequestOpSpecResult
+    16: 4,   # AccessSpecID
+}
+
+# Impinj custom parameters carried inside TLV 1023
+IMPINJ_VENDOR_ID = 25882
+IMPINJ_RF_PHASE_ANGLE = 56
+IMPINJ_PEAK_RSSI = 57
+IMPINJ_RF_DOPPLER_FREQUENCY = 68
+
+# Precompiled decoders, all used with unpack_from over the report buffer
+_TLV_HEADER = struct.Struct('>HH')
+_CUSTOM_HEADER = struct.Struct('>II')
+_U16 = struct.Struct('>H')
+_S16 = struct.Struct('>h')
+_S8 = struct.Struct('>b')
+_U64 = struct.Struct('>Q')
+
+# Handlers fill a list in TagReadBatch.append() argument order (timestamp in µs, EPC as raw
+# bytes, ..., TagSeenCount); the reader column is filled per batch
+_TIMESTAMP, _ANTENNA, _RSSI, _EPC, _PHASE, _CHANNEL, _DOPPLER, _SEEN = range(8)
+
+def _tv_antenna_id(buf, pos, end, rec):
+    rec[_ANTENNA] = _U16.unpack_from(buf, pos)[0]
+
+def _tv_first_seen_utc(buf, pos, end, rec):
+    rec[_TIMESTAMP] = _U64.unpack_from(buf, pos)[0]
+
+def _tv_last_seen_utc(buf, pos, end, rec):
+    if rec[_TIMESTAMP] is None:  # Only used when FirstSeen is not reported
+        rec[_TIMESTAMP] = _U64.unpack_from(buf, pos)[0]
+
+def _tv_peak_rssi(buf, pos, end, rec):
+    rec[_RSSI] = _S8.unpack_from(buf, pos)[0]
+
+def _tv_channel_index(buf, pos, end, rec):
+    rec[_CHANNEL] = _U16.unpack_from(buf, pos)[0]
+
+def _tv_tag_seen_count(buf, pos, end, rec):
+    rec[_SEEN] = _U16.unpack_from(buf, pos)[0]
+
+def _tv_epc_96(buf, pos, end, rec):
+    rec[_EPC] = bytes(buf[pos:end])
+
+def _tlv_epc_data(buf, pos, end, rec):
+    epc_bits = _U16.unpack_from(buf, pos)[0]
+    rec[_EPC] = bytes(buf[pos + 2:pos + 2 + (epc_bits + 7) // 8])
+
+def _impinj_phase_angle(buf, pos, end, rec):
+    rec[_PHASE] = _U16.unpack_from(buf, pos)[0]
+
+def _impinj_peak_rssi(buf, pos, end, rec):
+    if rec[_RSSI] is None:  # ImpinjPeakRSSI is in hundredths of a dBm
+        rec[_RSSI] = _S16.unpack_from(buf, pos)[0] // 100
+
+def _impinj_doppler_frequency(buf, pos, end, rec):
+    rec[_DOPPLER] = _S16.unpack_from(buf, pos)[0]
+
+IMPINJ_HANDLERS = {
+    IMPINJ_RF_PHASE_ANGLE: _impinj_phase_angle,
+    IMPINJ_PEAK_RSSI: _impinj_peak_rssi,
+    IMPINJ_RF_DOPPLER_FREQUENCY: _impinj_doppler_frequency,
+}
+
+def _tlv_custom(buf, pos, end, rec):
+    vendor_id, subtype = _CUSTOM_HEADER.unpack_from(buf, pos)
+    if vendor_id == IMPINJ_VENDOR_ID:
+        handler = IMPINJ_HANDLERS.get(subtype)
+        if handler:
+            handler(buf, pos + 8, end, rec)
+
+TV_HANDLERS = {
+    LLRP_TV_ANTENNA_ID: _tv_antenna_id,
+    LLRP_TV_FIRST_SEEN_UTC: _tv_first_seen_utc,
+    LLRP_TV_LAST_SEEN_UTC: _tv_last_seen_utc,
+    LLRP_TV_PEAK_RSSI: _tv_peak_rssi,
+    LLRP_TV_CHANNEL_INDEX: _tv_channel_index,
+    LLRP_TV_TAG_SEEN_COUNT: _tv_tag_seen_count,
+    LLRP_TV_EPC_96: _tv_epc_96,
+}
+
+TLV_HANDLERS = {
+    LLRP_PARAM_EPC_DATA: _tlv_epc_data,
+    LLRP_PARAM_CUSTOM: _tlv_custom,
+}
+
+# Flat lookup indexed by the 7-bit TV type: (value length, handler or None)
+_TV_TABLE = [None] * 128
+for _tv_type, _tv_length in LLRP_TV_LENGTHS.items():
+    _TV_TABLE[_tv_type] = (_tv_length, TV_HANDLERS.get(_tv_type))
+
+def _parse_tag_report_data(buf, pos: int, end: int) -> list:
+    """Decode the sub-parameters of one TagReportData into a field list."""
+    rec = [None] * 8
+    while pos < end:
+        first = buf[pos]
+        if first & 0x80:  # TV: 1-bit flag + 7-bit type, fixed length
+            entry = _TV_TABLE[first & 0x7F]
+            if entry is None:
+                break  # Unknown TV parameter, the rest cannot be framed
+            length, handler = entry
+            pos += 1
+            if handler:
+                handler(buf, pos, pos + length, rec)
+            pos += length
+        else:
+            param_type, length = _TLV_HEADER.unpack_from(buf, pos)
+            if length < 4:
+                break
+            handler = TLV_HANDLERS.get(param_type & 0x03FF)
+            if handler:
+                handler(buf, pos + 4, pos + length, rec)
+            pos += length
+    return rec
+
+def parse_ro_access_report(data) -> TagReadBatch:
+    """Parse an RO_ACCESS_REPORT message body (bytes or memoryview) into a batch of tag reads."""
+    reads = TagReadBatch()
     pos = 0
     msg_length = len(data)
 
-    while pos < msg_length:
-        param_type = struct.unpack('>H', data[pos:pos+2])[0]
-        param_length = struct.unpack('>H', data[pos+2:pos+4])[0]
-        
-        if param_type == 1024:  # TagReportData
-            param_data = data[pos+4:pos+param_length]
-            param_pos = 0
-            print(f"{datetime.datetime.now()}: Found TagReportData, length={param_length}")
-
-            tag_read = {
-                'timestamp': None,
-                'antenna': None,
-                'rssi': None,
-                'epc': None,
-                'phase_angle': None,
-                'channel_index': None,
-                'doppler_frequency': None
-            }
-            while param_pos < len(param_data):
-                sub_type = struct.unpack('>H', param_data[param_pos:param_pos+2])[0]
-                sub_length = struct.unpack('>H', param_data[param_pos+2:param_pos+4])[0]
-                
-                if sub_type == 1025:  # EPCData
-                    epc_length = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
-                    tag_read['epc'] = param_data[param_pos+6:param_pos+6+epc_length].hex()
-                    print(f"{datetime.datetime.now()}: Parsed EPC: {tag_read['epc']}")
-                elif sub_type == 1026:  # AntennaID
-                    tag_read['antenna'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
-                    print(f"{datetime.datetime.now()}: Parsed Antenna: {tag_read['antenna']}")
-                elif sub_type == 1027:  # PeakRSSI
-                    tag_read['rssi'] = struct.unpack('>h', param_data[param_pos+4:param_pos+6])[0]
-                    print(f"{datetime.datetime.now()}: Parsed RSSI: {tag_read['rssi']}")
-                elif sub_type == 1028:  # FirstSeenTimestampUTC
-                    timestamp_us = struct.unpack('>Q', param_data[param_pos+4:param_pos+12])[0]
-                    tag_read['timestamp'] = datetime.datetime.utcfromtimestamp(timestamp_us / 1_000_000).isoformat()
-                    print(f"{datetime.datetime.now()}: Parsed Timestamp: {tag_read['timestamp']}")
-                elif sub_type == 1030:  # PhaseAngle
-                    tag_read['phase_angle'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
-                    print(f"{datetime.datetime.now()}: Parsed PhaseAngle: {tag_read['phase_angle']}")
-                elif sub_type == 1031:  # ChannelIndex
-                    tag_read['channel_index'] = struct.unpack('>H', param_data[param_pos+4:param_pos+6])[0]
-                    print(f"{datetime.datetime.now()}: Parsed ChannelIndex: {tag_read['channel_index']}")
-                elif sub_type == 1032:  # DopplerFrequency
-                    tag_read['doppler_frequency'] = struct.unpack('>h', param_data[param_pos+4:param_pos+6])[0]
-                    print(f"{datetime.datetime.now()}: Parsed DopplerFrequency: {tag_read['doppler_frequency']}")
-                
-                param_pos += sub_length
-            
-            if tag_read['epc']:
-                reads.append(tag_read)
-                print(f"{datetime.datetime.now()}: Added tag read to list: {tag_read}")
-        
+    while pos + 4 <= msg_length:
+        param_type, param_length = _TLV_HEADER.unpack_from(data, pos)
+        if param_length < 4:
+            break
+        if param_type & 0x03FF == LLRP_PARAM_TAG_REPORT_DATA:
+            rec = _parse_tag_report_data(data, pos + 4, pos + param_length)
+            if rec[_EPC]:
+                reads.append(*rec)
         pos += param_length
-    
-    print(f"{datetime.datetime.now()}: Parsed {len(reads)} tag reads")
     return reads
 
-def configure_reader(reader_ip: str, reader_port: int) -> Optional[socket.socket]:
-    """Connect to the reader and configure it with minimal messages."""
+def _encode_tv(param_type: int, fmt: str, value) -> bytes:
+    return struct.pack('>B' + fmt, 0x80 | param_type, value)
+
+def _encode_impinj(subtype: int, fmt: str, value) -> bytes:
+    payload = struct.pack('>II' + fmt, IMPINJ_VENDOR_ID, subtype, value)
+    return _TLV_HEADER.pack(LLRP_PARAM_CUSTOM, 4 + len(payload)) + payload
+
+def build_tag_report_data(epc: str, antenna: int, rssi: int, timestamp_us: int,
+                          channel_index: Optional[int] = None, phase_angle: Optional[int] = None,
+                          doppler_frequency: Optional[int] = None) -> bytes:
+    """Encode one TagReportData parameter the way an Impinj reader sends it."""
+    epc_bytes = bytes.fromhex(epc)
+    if len(epc_bytes) == 12:
+        body = bytes([0x80 | LLRP_TV_EPC_96]) + epc_bytes
+    else:
+        epc_param = _U16.pack(len(epc_bytes) * 8) + epc_bytes
+        body = _TLV_HEADER.pack(LLRP_PARAM_EPC_DATA, 4 + len(epc_param)) + epc_param
+    body += _encode_tv(LLRP_TV_ANTENNA_ID, 'H', antenna)
+    body += _encode_tv(LLRP_TV_PEAK_RSSI, 'b', rssi)
+    if channel_index is not None:
+        body += _encode_tv(LLRP_TV_CHANNEL_INDEX, 'H', channel_index)
+    body += _encode_tv(LLRP_TV_FIRST_SEEN_UTC, 'Q', timestamp_us)
+    body += _encode_tv(LLRP_TV_LAST_SEEN_UTC, 'Q', timestamp_us)
+    if phase_angle is not None:
+        body += _encode_impinj(IMPINJ_RF_PHASE_ANGLE, 'H', phase_angle)
+    if doppler_frequency is not None:
+        body += _encode_impinj(IMPINJ_RF_DOPPLER_FREQUENCY, 'h', doppler_frequency)
+    return _TLV_HEADER.pack(LLRP_PARAM_TAG_REPORT_DATA, 4 + len(body)) + body
+
+# ROSpec and reader configuration parameter types
+LLRP_PARAM_ROSPEC = 177
+LLRP_PARAM_RO_BOUNDARY_SPEC = 178
+LLRP_PARAM_ROSPEC_START_TRIGGER = 179
+LLRP_PARAM_PERIODIC_TRIGGER_VALUE = 180
+LLRP_PARAM_ROSPEC_STOP_TRIGGER = 182
+LLRP_PARAM_AISPEC = 183
+LLRP_PARAM_AISPEC_STOP_TRIGGER = 184
+LLRP_PARAM_INVENTORY_PARAMETER_SPEC = 186
+LLRP_PARAM_KEEPALIVE_SPEC = 220
+LLRP_PARAM_ANTENNA_CONFIGURATION = 222
+LLRP_PARAM_RF_TRANSMITTER = 224
+LLRP_PARAM_RO_REPORT_SPEC = 237
+LLRP_PARAM_TAG_REPORT_CONTENT_SELECTOR = 238
+LLRP_PARAM_C1G2_INVENTORY_COMMAND = 330
+LLRP_PARAM_C1G2_FILTER = 331
+LLRP_PARAM_C1G2_TAG_INVENTORY_MASK = 332
+LLRP_PARAM_C1G2_STATE_UNAWARE_FILTER_ACTION = 333
+LLRP_PARAM_C1G2_RF_CONTROL = 335
+LLRP_PARAM_C1G2_SINGULATION_CONTROL = 336
+
+# Impinj extensions (custom message / parameter subtypes)
+IMPINJ_ENABLE_EXTENSIONS = 21
+IMPINJ_TAG_REPORT_CONTENT_SELECTOR = 50
+IMPINJ_ENABLE_RF_PHASE_ANGLE = 52
+IMPINJ_ENABLE_PEAK_RSSI = 53
+IMPINJ_ENABLE_RF_DOPPLER_FREQUENCY = 67
+
+# TagReportContentSelector flags
+REPORT_ANTENNA_ID = 0x1000
+REPORT_CHANNEL_INDEX = 0x0800
+REPORT_PEAK_RSSI = 0x0400
+REPORT_FIRST_SEEN = 0x0200
+REPORT_LAST_SEEN = 0x0100
+REPORT_TAG_SEEN_COUNT = 0x0080
+
+ROSPEC_ID = 1
+
+# Inventory settings sent in the ROSpec; main() overrides these from the command line
+READER_SETTINGS = {
+    'antennas': [1, 2, 3, 4],
+    'tx_power': 0,               # Index into the reader's transmit power table, 0 = reader maximum
+    'mode_index': 2,             # C1G2 RF mode (see Reader_Settings.txt)
+    'session': 2,                # C1G2 session 0-3
+    'tag_population': 32,        # Expected number of tags in the field
+    'report_every_n_tags': 1,    # Tags per RO_ACCESS_REPORT
+    'report_timeout_ms': 0,      # Also report after this long (restarts the ROSpec); 0 = only on N tags
+    'impinj_reports': True,      # Request Impinj phase angle, peak RSSI and Doppler frequency
+    'epc_filters': [],           # Hex EPC prefixes (a full EPC = exact match); the reader only reports these
+    'keepalive_ms': 5000,        # Reader sends a KEEPALIVE this often; 0 = off (no dead-link detection)
+}
+
+# A link silent for this many keepalive periods is treated as dead and reconnected
+MISSED_KEEPALIVES = 3
+
+# C1G2 state-unaware filter actions: the first filter deselects everything else,
+# later ones only add their matches, so several filters combine as OR. The
+# action is the top 3 bits of its byte; the low 5 bits are reserved.
+FILTER_SELECT_UNSELECT = 0
+FILTER_SELECT_ONLY = 1
+FILTER_ACTION_SHIFT = 5
+MAX_EPC_FILTERS = 2  # C1G2Filters an Impinj reader accepts per InventoryParameterSpec
+
+def _param(param_type: int, *parts: bytes) -> bytes:
+    """Encode a TLV parameter from its already-encoded fields and sub-parameters."""
+    body = b''.join(parts)
+    return _TLV_HEADER.pack(param_type, 4 + len(body)) + body
+
+def _impinj_param(subtype: int, *parts: bytes) -> bytes:
+    return _param(LLRP_PARAM_CUSTOM, _CUSTOM_HEADER.pack(IMPINJ_VENDOR_ID, subtype), *parts)
+
+def build_c1g2_filters(prefixes: List[str]) -> List[bytes]:
+    """C1G2Filter parameters selecting only tags whose EPC starts with one of `prefixes`."""
+    filters = []
+    for i, prefix in enumerate(prefixes):
+        bit_count, mask = epc_mask(prefix)
+        filters.append(_param(
+            LLRP_PARAM_C1G2_FILTER,
+            b'\x00',  # T = 0: no truncation
+            _param(LLRP_PARAM_C1G2_TAG_INVENTORY_MASK,
+                   struct.pack('>BHH', EPC_BANK << 6, EPC_BIT_POINTER, bit_count), mask),
+            _param(LLRP_PARAM_C1G2_STATE_UNAWARE_FILTER_ACTION,
+                   bytes([(FILTER_SELECT_ONLY if i else FILTER_SELECT_UNSELECT) << FILTER_ACTION_SHIFT])),
+        ))
+    return filters
+
+def build_rospec(settings: Dict, rospec_id: int = ROSPEC_ID) -> bytes:
+    """Build the ROSpec parameter for ADD_ROSPEC from READER_SETTINGS-style settings."""
+    antennas = settings['antennas']
+    timeout_ms = settings['report_timeout_ms']
+
+    if timeout_ms:
+        # Periodic start every timeout_ms with a matching duration stop: each
+        # run ends (flushing a report) and the next period starts it again
+        boundary = _param(
+            LLRP_PARAM_RO_BOUNDARY_SPEC,
+            _param(LLRP_PARAM_ROSPEC_START_TRIGGER, b'\x02',                   # Periodic
+                   _param(LLRP_PARAM_PERIODIC_TRIGGER_VALUE, struct.pack('>II', 0, timeout_ms))),
+            _param(LLRP_PARAM_ROSPEC_STOP_TRIGGER, struct.pack('>BI', 1, timeout_ms)),  # Duration
+        )
+    else:
+        boundary = _param(
+            LLRP_PARAM_RO_BOUNDARY_SPEC,
+            _param(LLRP_PARAM_ROSPEC_START_TRIGGER, b'\x01'),                 # Immediate
+            _param(LLRP_PARAM_ROSPEC_STOP_TRIGGER, struct.pack('>BI', 0, 0)),  # Null: run until deleted
+        )
+
+    filters = build_c1g2_filters(settings.get('epc_filters') or [])
+    antenna_configs = []
+    for antenna in antennas:
+        parts = []
+        if settings['tx_power']:
+            # HopTableID 1, ChannelIndex 1 (ignored when hopping), power table index
+            parts.append(_param(LLRP_PARAM_RF_TRANSMITTER, struct.pack('>HHH', 1, 1, settings['tx_power'])))
+        parts.append(_param(
+            LLRP_PARAM_C1G2_INVENTORY_COMMAND,
+            b'\x00',  # TagInventoryStateAware = 0
+            *filters,
+            _param(LLRP_PARAM_C1G2_RF_CONTROL, struct.pack('>HH', settings['mode_index'], 0)),
+            _param(LLRP_PARAM_C1G2_SINGULATION_CONTROL,
+                   struct.pack('>BHI', settings['session'] << 6, settings['tag_population'], 0)),
+        ))
+        antenna_configs.append(_param(LLRP_PARAM_ANTENNA_CONFIGURATION, _U16.pack(antenna), *parts))
+
+    # The AISpec runs until the ROSpec stops (Null stop trigger)
+    aispec = _param(
+        LLRP_PARAM_AISPEC,
+        _U16.pack(len(antennas)),
+        struct.pack(f'>{len(antennas)}H', *antennas),
+        _param(LLRP_PARAM_AISPEC_STOP_TRIGGER, struct.pack('>BI', 0, 0)),
+        _param(LLRP_PARAM_INVENTORY_PARAMETER_SPEC, struct.pack('>HB', 1, 1), *antenna_configs),  # EPCGlobal C1G2
+    )
+
+    selector = (REPORT_ANTENNA_ID | REPORT_CHANNEL_INDEX | REPORT_PEAK_RSSI |
+                REPORT_FIRST_SEEN | REPORT_LAST_SEEN | REPORT_TAG_SEEN_COUNT)
+    report_parts = [_param(LLRP_PARAM_TAG_REPORT_CONTENT_SELECTOR, _U16.pack(selector))]
+    if settings['impinj_reports']:
+        report_parts.append(_impinj_param(
+            IMPINJ_TAG_REPORT_CONTENT_SELECTOR,
+            _impinj_param(IMPINJ_ENABLE_RF_PHASE_ANGLE, _U16.pack(1)),
+            _impinj_param(IMPINJ_ENABLE_PEAK_RSSI, _U16.pack(1)),
+            _impinj_param(IMPINJ_ENABLE_RF_DOPPLER_FREQUENCY, _U16.pack(1)),
+        ))
+    # ROReportTrigger 2: upon N tags or end of ROSpec (each periodic run with a timeout)
+    report = _param(LLRP_PARAM_RO_REPORT_SPEC, struct.pack('>BH', 2, settings['report_every_n_tags']), *report_parts)
+
+    return _param(LLRP_PARAM_ROSPEC, struct.pack('>IBB', rospec_id, 0, 0), boundary, aispec, report)
+
+def pipeline_messages(requests: List[Tuple[str, int, bytes]]) -> Tuple[bytes, Dict[int, str]]:
+    """Encode requests into one buffer; returns it with a msg_id -> request name map."""
+    pending = {}
+    messages = []
+    for name, msg_type, data in requests:
+        msg_id = next(_msg_ids)
+        pending[msg_id] = name
+        messages.append(create_llrp_message(msg_type, data, msg_id))
+    return b''.join(messages), pending
+
+def collect_responses(stream: LLRPStream, pending: Dict[int, str], results: Dict[str, Dict]):
+    """Match buffered responses to `pending` requests, stopping once none are left."""
+    for received_type, msg_id, body in stream.messages():
+        if received_type in UNSOLICITED_MESSAGES or msg_id not in pending:
+            logger.debug(f"Skipping message type {received_type} (id {msg_id}) during configuration")
+            continue
+        name = pending.pop(msg_id)
+        results[name] = parse_llrp_response(received_type, body)
+        logger.debug(f"{name} response: {results[name]}")
+        if not pending:
+            break  # Leave anything after the last response for the reader loop
+
+def llrp_pipeline(sock: socket.socket, stream: LLRPStream, requests: List[Tuple[str, int, bytes]]) -> Dict[str, Dict]:
+    """Send requests back to back and collect their responses by message ID."""
+    data, pending = pipeline_messages(requests)
+    sock.sendall(data)
+    results = {}
+    while pending:
+        collect_responses(stream, pending, results)
+        if pending and not stream.fill(sock):
+            raise ConnectionResetError("Reader closed connection during configuration")
+    return results
+
+def connection_accepted(stream: LLRPStream) -> bool:
+    """True once a buffered READER_EVENT_NOTIFICATION accepts the connection; raises if refused."""
+    for msg_type, msg_id, body in stream.messages():
+        if msg_type != LLRP_MSG_READER_EVENT_NOTIFICATION:
+            continue
+        status = parse_connection_event(body)
+        if status is None:
+            continue
+        if status != 0:
+            raise ConnectionRefusedError(f"Reader refused connection (ConnectionAttemptEvent status {status})")
+        return True
+    return False
+
+def wait_for_connection_event(sock: socket.socket, stream: LLRPStream):
+    """Block until the reader's READER_EVENT_NOTIFICATION accepts or refuses the connection."""
+    while not connection_accepted(stream):
+        if not stream.fill(sock):
+            raise ConnectionResetError("Reader closed connection before accepting it")
+
+CAPABILITIES_REQUEST = [
+    ('GET_READER_CAPABILITIES', LLRP_MSG_GET_READER_CAPABILITIES, b'\x00'),  # RequestedData: All
+]
+
+def apply_capabilities(settings: Dict, capabilities: Dict) -> Dict:
+    """Drop antennas the reader does not have."""
+    max_antennas = capabilities.get('max_antennas')
+    if max_antennas and any(a > max_antennas for a in settings['antennas']):
+        logger.warning(f"Reader supports {max_antennas} antennas; dropping {settings['antennas']} above that")
+        settings = dict(settings, antennas=[a for a in settings['antennas'] if a <= max_antennas])
+    return settings
+
+def link_timeout(settings: Dict) -> Optional[float]:
+    """Seconds without any message from the reader after which the link counts as dead (None = never)."""
+    if not settings['keepalive_ms']:
+        return None
+    return settings['keepalive_ms'] * MISSED_KEEPALIVES / 1000
+
+def setup_requests(settings: Dict) -> List[Tuple[str, int, bytes]]:
+    """Messages that reset the reader and install and enable our ROSpec, in order."""
+    requests = []
+    keepalive_ms = settings['keepalive_ms']
+    if settings['impinj_reports']:
+        # Required before Impinj report parameters are accepted
+        requests.append(('IMPINJ_ENABLE_EXTENSIONS', LLRP_MSG_CUSTOM_MESSAGE,
+                         struct.pack('>IBI', IMPINJ_VENDOR_ID, IMPINJ_ENABLE_EXTENSIONS, 0)))
+    requests += [
+        # ResetToFactoryDefault, then a KeepaliveSpec (type 1 = periodic) so a dead link shows up as silence
+        ('SET_READER_CONFIG', LLRP_MSG_SET_READER_CONFIG, b'\x80' + _param(
+            LLRP_PARAM_KEEPALIVE_SPEC, struct.pack('>BI', 1 if keepalive_ms else 0, keepalive_ms))),
+        ('DELETE_ROSPEC', LLRP_MSG_DELETE_ROSPEC, struct.pack('>I', 0)),            # ROSpecID 0 deletes all
+        ('ADD_ROSPEC', LLRP_MSG_ADD_ROSPEC, build_rospec(settings)),
+        ('ENABLE_ROSPEC', LLRP_MSG_ENABLE_ROSPEC, struct.pack('>I', ROSPEC_ID)),  # Immediate start trigger
+    ]
+    return requests
+
+def check_setup_results(results: Dict[str, Dict]):
+    """Raise if the ROSpec could not be installed; warn about anything else that failed."""
+    for name, status in results.items():
+        if status['status'] != 'Success':
+            if name in ('ADD_ROSPEC', 'ENABLE_ROSPEC'):
+                raise RuntimeError(f"{name} failed: {status['status']} {status['error_msg']}")
+            logger.warning(f"{name} failed, continuing anyway")
+
+def configure_reader(reader_ip: str, reader_port: int,
+                     settings: Dict = READER_SETTINGS) -> Tuple[socket.socket, LLRPStream]:
+    """Connect to the reader, install our ROSpec and enable it (one attempt; raises on failure)."""
     global reader_socket
-    max_retries = 2
-    for attempt in range(max_retries + 1):
-        try:
-            print(f"{datetime.datetime.now()}: Attempting to connect to {reader_ip}:{reader_port} (attempt {attempt + 1}/{max_retries + 1})")
-            reader_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            reader_socket.settimeout(5.0)
-            reader_socket.connect((reader_ip, reader_port))
-            print(f"{datetime.datetime.now()}: Connected to reader")
-            time.sleep(0.1)
-
-            # CLOSE_CONNECTION to test session management
-            print(f"{datetime.datetime.now()}: Sending CLOSE_CONNECTION")
-            close_data = b''
-            reader_socket.send(create_llrp_message(LLRP_MSG_CLOSE_CONNECTION, close_data))
-            try:
-                response = reader_socket.recv(4096)
-                status = parse_llrp_response(response)
-                print(f"{datetime.datetime.now()}: CLOSE_CONNECTION response: {status}")
-            except socket.timeout:
-                print(f"{datetime.datetime.now()}: No CLOSE_CONNECTION response, continuing")
-            time.sleep(0.1)
-
-            # Reconnect
-            reader_socket.close()
-            reader_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            reader_socket.settimeout(5.0)
-            reader_socket.connect((reader_ip, reader_port))
-            print(f"{datetime.datetime.now()}: Reconnected to reader")
-            time.sleep(0.1)
-
-            # GET_READER_CAPABILITIES
-            print(f"{datetime.datetime.now()}: Sending GET_READER_CAPABILITIES")
-            capabilities_data = b'\x00\x01'  # RequestedData: All (type 1)
-            reader_socket.send(create_llrp_message(LLRP_MSG_GET_READER_CAPABILITIES, capabilities_data))
-            response = reader_socket.recv(4096)
-            status = parse_llrp_response(response)
-            print(f"{datetime.datetime.now()}: GET_READER_CAPABILITIES response: {status}")
-            if status['status'] != 'Success' and status['msg_type'] != 113:
-                print(f"{datetime.datetime.now()}: GET_READER_CAPABILITIES failed, continuing anyway")
-            time.sleep(0.1)
-
-            # DELETE_ALL_ROSPECS
-            print(f"{datetime.datetime.now()}: Sending DELETE_ALL_ROSPECS")
-            delete_data = b'\x00\x00\x00\x00'  # ROSpecID 0 (delete all)
-            reader_socket.send(create_llrp_message(LLRP_MSG_DELETE_ALL_ROSPECS, delete_data))
-            response = reader_socket.recv(4096)
-            status = parse_llrp_response(response)
-            print(f"{datetime.datetime.now()}: DELETE_ALL_ROSPECS response: {status}")
-            if status['status'] != 'Success' and status['msg_type'] != 32:
-                print(f"{datetime.datetime.now()}: DELETE_ALL_ROSPECS failed, continuing anyway")
-            time.sleep(0.1)
-
-            # SET_READER_CONFIG: Minimal reset
-            print(f"{datetime.datetime.now()}: Sending SET_READER_CONFIG")
-            config_data = (
-                b'\x00\x06\x00\x04'  # Reset to factory defaults (type 6, length 4)
-            )
-            reader_socket.send(create_llrp_message(LLRP_MSG_SET_READER_CONFIG, config_data))
-            response = reader_socket.recv(4096)
-            status = parse_llrp_response(response)
-            print(f"{datetime.datetime.now()}: SET_READER_CONFIG response: {status}")
-            if status['status'] != 'Success' and status['msg_type'] != 111:
-                print(f"{datetime.datetime.now()}: SET_READER_CONFIG failed, continuing anyway")
-            time.sleep(0.1)
-
-            reader_socket.settimeout(1.0)  # Timeout for tag reading
-            print(f"{datetime.datetime.now()}: Reader configured successfully")
-            return reader_socket
-        
-        except (ConnectionResetError, BrokenPipeError, socket.timeout) as e:
-            print(f"{datetime.datetime.now()}: Configure reader error (attempt {attempt + 1}): {e}")
-            if reader_socket:
-                reader_socket.close()
-                reader_socket = None
-            if attempt < max_retries:
-                print(f"{datetime.datetime.now()}: Retrying configuration in 1 second...")
-                time.sleep(1)
-            else:
-                print(f"{datetime.datetime.now()}: Max configuration retries reached")
-                return None
-        except Exception as e:
-            print(f"{datetime.datetime.now()}: Configure reader error (attempt {attempt + 1}): {e}")
-            if reader_socket:
-                reader_socket.close()
-                reader_socket = None
-            if attempt < max_retries:
-                print(f"{datetime.datetime.now()}: Retrying configuration in 1 second...")
-                time.sleep(1)
-            else:
-                print(f"{datetime.datetime.now()}: Max configuration retries reached")
-                return None
-
-def reader_thread(reader_ip: str, reader_port: int):
-    """Thread to handle LLRP communication and queue tag reads."""
-    max_retries = 3
-    retry_delay = 5  # seconds
-    print(f"{datetime.datetime.now()}: Starting reader thread")
-    print(f"{datetime.datetime.now()}: Running event state: {running.is_set()}")
+    logger.info(f"Connecting to {reader_ip}:{reader_port}")
+    reader_socket = socket.create_connection((reader_ip, reader_port), timeout=5.0)
+    reader_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    stream = LLRPStream()
+    if raw_capture:
+        raw_capture.new_connection()
+        stream.tap = raw_capture.write
+    wait_for_connection_event(reader_socket, stream)
+    logger.info("Connected to reader")
+
+    # Capabilities do not change across reconnects, so only ask once per reader
+    key = (reader_ip, reader_port)
+    capabilities = reader_capabilities.get(key)
+    if capabilities is None:
+        status = llrp_pipeline(reader_socket, stream, CAPABILITIES_REQUEST)['GET_READER_CAPABILITIES']
+        if status['status'] != 'Success':
+            logger.warning("GET_READER_CAPABILITIES failed, continuing anyway")
+        capabilities = reader_capabilities[key] = status['capabilities']
+        logger.info(f"Reader capabilities: {capabilities}")
+    settings = apply_capabilities(settings, capabilities)
+
+    # The reader processes messages in order, so the whole setup goes out in one write
+    check_setup_results(llrp_pipeline(reader_socket, stream, setup_requests(settings)))
+
+    reader_socket.settimeout(1.0)  # Timeout for tag reading
+    logger.info(f"Reader configured successfully: antennas={settings['antennas']}, "
+                f"{settings['report_every_n_tags']} tags/report, timeout {settings['report_timeout_ms']} ms")
+    return reader_socket, stream
+
+def reconnect_delay(failures: int) -> float:
+    """Jittered exponential backoff: uniform in [0, min(cap, base * 2^failures)]."""
+    return random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** failures))
+
+def reader_thread(reader_ip: str, reader_port: int, settings: Dict = READER_SETTINGS):
+    """Thread to handle LLRP communication and queue tag reads, reconnecting with backoff."""
+    global reader_socket
+    failures = 0
+    reader_id = reader_table.intern(f"{reader_ip}:{reader_port}")
+    dead_after = link_timeout(settings)
+    logger.debug("Starting reader thread")
 
     while running.is_set():
-        print(f"{datetime.datetime.now()}: Entering reader thread loop")
+        connect_start = time.perf_counter()
+        first_tag_pending = True
         try:
-            global reader_socket
-            print(f"{datetime.datetime.now()}: Configuring reader")
-            reader_socket = configure_reader(reader_ip, reader_port)
-            if not reader_socket:
-                raise RuntimeError("Failed to configure reader")
-
-            print(f"{datetime.datetime.now()}: Reader connected and configured")
+            reader_socket, stream = configure_reader(reader_ip, reader_port, settings)
+            failures = 0
+            logger.info(f"Reader connected and configured in {(time.perf_counter() - connect_start) * 1000:.0f} ms")
+            last_received = time.monotonic()
 
             while running.is_set():
                 try:
-                    print(f"{datetime.datetime.now()}: Waiting for data from reader")
-                    data = reader_socket.recv(4096)
-                    if not data:
-                        print(f"{datetime.datetime.now()}: Reader closed connection")
+                    # Messages already buffered during configuration are handled first
+                    for msg_type, msg_id, body in stream.messages():
+                        if msg_type == LLRP_MSG_RO_ACCESS_REPORT:
+                            reads = parse_ro_access_report(body)
+                            reads.set_reader(reader_id)
+                            stats.reports += 1
+                            stats.reads += len(reads)
+                            if read_tracer.enabled:
+                                read_tracer.trace(reads)
+                            if reads:
+                                if first_tag_pending:
+                                    first_tag_pending = False
+                                    stats.time_to_first_tag_ms = (time.perf_counter() - connect_start) * 1000
+                                    logger.info(f"Time to first tag: {stats.time_to_first_tag_ms:.0f} ms")
+                                tag_queue.put(reads)
+                        elif msg_type == LLRP_MSG_KEEPALIVE:
+                            reader_socket.sendall(create_llrp_message(LLRP_MSG_KEEPALIVE_ACK, b''))
+
+                    received = stream.fill(reader_socket)
+                    if not received:
+                        logger.warning("Reader closed connection")
                         break
-                    
-                    print(f"{datetime.datetime.now()}: Received {len(data)} bytes")
-                    if len(data) < 10:
-                        print(f"{datetime.datetime.now()}: Data too short, skipping")
-                        continue
-                    msg_type = struct.unpack('>H', data[0:2])[0] & 0x03FF
-                    print(f"{datetime.datetime.now()}: Message type: {msg_type}")
-                    if msg_type == LLRP_MSG_RO_ACCESS_REPORT:
-                        reads = parse_ro_access_report(data[10:])
-                        print(f"{datetime.datetime.now()}: Queuing {len(reads)} tag reads")
-                        for read in reads:
-                            tag_queue.put(read)
-                
+                    stats.bytes += received
+                    last_received = time.monotonic()
+
                 except socket.timeout:
-                    print(f"{datetime.datetime.now()}: Receive timeout, continuing")
+                    # Reports or keepalives should arrive at least every keepalive period
+                    if dead_after and time.monotonic() - last_received > dead_after:
+                        raise ConnectionResetError(f"No messages from reader for {dead_after:g} s")
                     continue
-        
-        except (ConnectionResetError, ConnectionRefusedError) as e:
-            print(f"{datetime.datetime.now()}: Connection error: {e}")
-            if reader_socket:
-                print(f"{datetime.datetime.now()}: Closing reader socket")
-                reader_socket.close()
-                reader_socket = None
-            if max_retries > 0:
-                print(f"{datetime.datetime.now()}: Retrying in {retry_delay} seconds... ({max_retries} retries left)")
-                time.sleep(retry_delay)
-                max_retries -= 1
-                continue
-            else:
-                print(f"{datetime.datetime.now()}: Max retries reached. Stopping reader thread.")
-                break
-        
+
+        except (OSError, ValueError, RuntimeError) as e:
+            # OSError covers refused/reset connections and connect timeouts
+            logger.warning(f"Connection error: {e}")
+
         except Exception as e:
-            print(f"{datetime.datetime.now()}: Reader thread error: {e}")
+            logger.error(f"Reader thread error: {e}")
             break
-        
+
         finally:
             if reader_socket:
-                print(f"{datetime.datetime.now()}: Closing reader socket")
+                logger.info("Closing reader socket")
                 reader_socket.close()
                 reader_socket = None
-    
-    print(f"{datetime.datetime.now()}: Reader thread stopped")
+
+        if running.is_set():
+            delay = reconnect_delay(failures)
+            failures += 1
+            stats.reconnects += 1
+            logger.warning(f"Reconnecting in {delay:.2f} seconds (attempt {failures})")
+            time.sleep(delay)
+
+    logger.info("Reader thread stopped")
     running.clear()
 
-def csv_writer_thread(output_file: str):
-    """Thread to write tag reads from queue to CSV."""
-    print(f"{datetime.datetime.now()}: Starting CSV writer thread, output file: {output_file}")
-    with open(output_file, 'w', newline='') as csvfile:
-        fieldnames = ['timestamp', 'antenna', 'rssi', 'epc', 'phase_angle', 'channel_index', 'doppler_frequency']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        print(f"{datetime.datetime.now()}: Wrote CSV header")
-        
-        batch = []
+def writer_thread(sink: TagSink):
+    """Thread to write tag read batches from the queue to the output sink."""
+    logger.info(f"Starting writer thread, output file: {sink.path}")
+    with sink:
+        pending = TagReadBatch()
         last_flush = time.time()
+
+        def flush():
+            sink.write(pending)
+            stats.written += len(pending)
         
         while running.is_set() or not tag_queue.empty():
             try:
-                print(f"{datetime.datetime.now()}: Checking queue, size={tag_queue.qsize()}")
-                read = tag_queue.get(timeout=1.0)
-                batch.append(read)
-                print(f"{datetime.datetime.now()}: Dequeued tag read: {read}")
+                pending.extend(tag_queue.get(timeout=1.0))
                 
-                if len(batch) >= 100 or time.time() - last_flush >= 1.0:
-                    print(f"{datetime.datetime.now()}: Writing batch of {len(batch)} reads to CSV")
-                    for read in batch:
-                        writer.writerow(read)
-                    csvfile.flush()
-                    print(f"{datetime.datetime.now()}: Flushed batch to CSV")
-                    batch = []
+                if len(pending) >= 100 or time.time() - last_flush >= 1.0:
+                    flush()
+                    pending = TagReadBatch()
                     last_flush = time.time()
-                
-                tag_queue.task_done()
             
             except queue.Empty:
-                print(f"{datetime.datetime.now()}: Queue empty")
-                if batch:
-                    print(f"{datetime.datetime.now()}: Writing remaining batch of {len(batch)} reads to CSV")
-                    for read in batch:
-                        writer.writerow(read)
-                    csvfile.flush()
-                    print(f"{datetime.datetime.now()}: Flushed remaining batch to CSV")
-                    batch = []
+                if pending:
+                    flush()
+                    pending = TagReadBatch()
                     last_flush = time.time()
+
+        if pending:
+            flush()
     
-    print(f"{datetime.datetime.now()}: CSV writer thread stopped")
+    logger.info("Writer thread stopped")
+
+def stats_thread(interval: float):
+    """Thread to log a throughput summary line every `interval` seconds."""
+    last = stats.snapshot()
+    last_time = time.time()
+    while running.is_set():
+        time.sleep(interval)
+        now = time.time()
+        current = stats.snapshot()
+        elapsed = max(now - last_time, 1e-6)
+        reads, reports, nbytes, written = (c - p for c, p in zip(current, last))
+        ring = tag_queue.metrics()
+        logger.info(
+            f"{reads / elapsed:.0f} reads/s, {reports / elapsed:.0f} reports/s, "
+            f"{nbytes / elapsed / 1024:.1f} KiB/s, queue depth {ring['depth']} (high water {ring['high_water']}), "
+            f"dropped {ring['dropped']}, coalesced {ring['coalesced']}, writer lag {ring['lag_ms']:.0f} ms "
+            f"(max {ring['max_lag_ms']:.0f} ms), {written / elapsed:.0f} writes/s, total reads {current[0]}"
+        )
+        last, last_time = current, now
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C to gracefully shut down."""
-    print(f"{datetime.datetime.now()}: Received SIGINT, stopping reader...")
+    logger.info("Received SIGINT, stopping reader...")
     running.clear()
     if reader_socket:
-        print(f"{datetime.datetime.now()}: Closing reader socket in signal handler")
+        logger.info("Closing reader socket in signal handler")
         reader_socket.close()
+    if raw_capture:
+        raw_capture.close()
     sys.exit(0)
 
 def main():
-    print(f"{datetime.datetime.now()}: Starting RFID reader script")
     parser = argparse.ArgumentParser(description="Custom RFID tag reader")
     parser.add_argument('--reader-ip', default='192.168.1.100', help='Reader IP address')
     parser.add_argument('--reader-port', type=int, default=5084, help='Reader port')
     parser.add_argument('--duration', type=int, help='Run duration in seconds')
+    parser.add_argument('--antennas', default='1,2,3,4', help='Comma-separated antenna ports')
+    parser.add_argument('--tx-power', type=int, default=0, help='Transmit power table index (0 = reader maximum)')
+    parser.add_argument('--mode', type=int, default=READER_SETTINGS['mode_index'], help='C1G2 RF mode index')
+    parser.add_argument('--session', type=int, choices=[0, 1, 2, 3], default=READER_SETTINGS['session'],
+                        help='C1G2 session')
+    parser.add_argument('--tag-population', type=int, default=READER_SETTINGS['tag_population'],
+                        help='Expected tag population')
+    parser.add_argument('--report-every-n-tags', type=int, default=READER_SETTINGS['report_every_n_tags'],
+                        help='Tags batched into each RO_ACCESS_REPORT')
+    parser.add_argument('--report-timeout-ms', type=int, default=READER_SETTINGS['report_timeout_ms'],
+                        help='Also send a report after this many ms; the ROSpec runs in periods of this length (0 = only on N tags)')
+    parser.add_argument('--no-impinj-reports', action='store_true',
+                        help='Do not request Impinj phase angle / Doppler parameters')
+    parser.add_argument('--keepalive-ms', type=int, default=READER_SETTINGS['keepalive_ms'],
+                        help=f'Reader keepalive period; {MISSED_KEEPALIVES} periods without any message '
+                             'count as a dead link and reconnect (0 = off)')
+    parser.add_argument('--epc-filter', action='append', default=[], metavar='HEX',
+                        help='Only inventory tags whose EPC starts with this hex prefix (repeatable, at '
+                             f'most {MAX_EPC_FILTERS}; a full EPC is an exact match). Applied by the reader '
+                             'as a C1G2 filter')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Console log level')
+    parser.add_argument('--trace-reads', action='store_true', help='Log individual tag reads (off by default)')
+    parser.add_argument('--trace-sample', type=int, default=1, help='With --trace-reads, log 1 in N reads')
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help='Seconds between throughput summary lines (0 to disable)')
+    parser.add_argument('--queue-capacity', type=int, default=100_000,
+                        help='Maximum tag reads buffered between the reader and writer threads')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='What to do when the buffer is full')
+    add_sink_arguments(parser)
+    parser.add_argument('--capture-raw', metavar='PATH',
+                        help='Also record the raw LLRP byte stream for llrp_capture.py replay')
     args = parser.parse_args()
-    print(f"{datetime.datetime.now()}: Arguments: ip={args.reader_ip}, port={args.reader_port}, duration={args.duration}")
+    if len(args.epc_filter) > MAX_EPC_FILTERS:
+        parser.error(f"at most {MAX_EPC_FILTERS} --epc-filter values are supported by the reader, "
+                     f"got {len(args.epc_filter)}")
+    for prefix in args.epc_filter:
+        try:
+            epc_mask(prefix)
+        except ValueError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    read_tracer.configure(args.trace_reads, args.trace_sample)
+    global raw_capture
+    if args.capture_raw:
+        raw_capture = CaptureWriter(args.capture_raw)
+    tag_queue.configure(args.queue_capacity, args.overflow)
+    READER_SETTINGS.update({
+        'antennas': [int(a) for a in args.antennas.split(',')],
+        'tx_power': args.tx_power,
+        'mode_index': args.mode,
+        'session': args.session,
+        'tag_population': args.tag_population,
+        'report_every_n_tags': args.report_every_n_tags,
+        'report_timeout_ms': args.report_timeout_ms,
+        'impinj_reports': not args.no_impinj_reports,
+        'epc_filters': args.epc_filter,
+        'keepalive_ms': args.keepalive_ms,
+    })
+    logger.info("Starting RFID reader script")
+    logger.info(f"Arguments: ip={args.reader_ip}, port={args.reader_port}, duration={args.duration}")
 
     # Set up output file
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = f'rfid_reads_{timestamp}.csv'
-    print(f"{datetime.datetime.now()}: Output file: {output_file}")
+    sink = open_sink_from_args(args, f'rfid_reads_{timestamp}')
 
     # Set up signal handler
-    print(f"{datetime.datetime.now()}: Setting up signal handler")
+    logger.debug("Setting up signal handler")
     signal.signal(signal.SIGINT, signal_handler)
 
     # Set running event
-    print(f"{datetime.datetime.now()}: Setting running event")
+    logger.debug("Setting running event")
     running.set()
 
     # Start threads
-    print(f"{datetime.datetime.now()}: Starting reader thread")
+    logger.info("Starting reader thread")
     reader_t = threading.Thread(target=reader_thread, args=(args.reader_ip, args.reader_port))
-    print(f"{datetime.datetime.now()}: Starting CSV writer thread")
-    writer_t = threading.Thread(target=csv_writer_thread, args=(output_file,))
+    logger.debug("Starting writer thread")
+    writer_t = threading.Thread(target=writer_thread, args=(sink,))
     
     reader_t.start()
     writer_t.start()
-    print(f"{datetime.datetime.now()}: Threads started")
+    if args.stats_interval > 0:
+        threading.Thread(target=stats_thread, args=(args.stats_interval,), daemon=True).start()
+    logger.debug("Threads started")
 
     # Run for specified duration or indefinitely
     if args.duration:
-        print(f"{datetime.datetime.now()}: Running for {args.duration} seconds")
+        logger.info(f"Running for {args.duration} seconds")
         time.sleep(args.duration)
-        print(f"{datetime.datetime.now()}: Duration ended, stopping")
+        logger.info("Duration ended, stopping")
         running.clear()
     
-    print(f"{datetime.datetime.now()}: Waiting for threads to join")
+    logger.debug("Waiting for threads to join")
     reader_t.join()
+    tag_queue.close()
     writer_t.join()
-    print(f"{datetime.datetime.now()}: Script finished")
+    if raw_capture:
+        raw_capture.close()
+    logger.info("Script finished")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import ast
+import re
+from typing import Dict, List
+
+# sllurp.verb.inventory logs each tag report as "... saw tag(s): [{...}, {...}]",
+# either on one line or pretty-printed over several
+SAW_TAGS = 'saw tag(s): '
+
+# Quoted strings (so brackets inside them are skipped) and the brackets themselves
+_TOKENS = re.compile(r"'[^'\\]*(?:\\.[^'\\]*)*'|\"[^\"\\]*(?:\\.[^\"\\]*)*\"|[\[\]{}]")
+
+# One "'Key': value" entry of a flat tag dict, with the separator after it
+_ENTRY = re.compile(
+    r"\s*'([^'\\]*)'\s*:\s*"
+    r"(b'[^'\\]*'|'[^'\\]*'|-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|None|True|False)"
+    r"\s*(,|\})"
+)
+_CONSTANTS = {'None': None, 'True': True, 'False': False}
+
+def decode_tag(text: str) -> Dict:
+    """Decode one tag dict literal as printed by sllurp.
+
+    Handles the flat {'Key': int | float | b'...' | '...' | None | bool}
+    dicts sllurp prints with a single regex pass, several times faster than
+    ast.literal_eval; anything else (escapes, nested values) falls back to
+    ast.literal_eval. Raises ValueError or SyntaxError like literal_eval.
+    """
+    text = text.strip()
+    tag = {}
+    pos = 1
+    end = len(text)
+    if text[:1] == '{' and text[1:].strip() == '}':
+        return tag
+    while text[:1] == '{':
+        m = _ENTRY.match(text, pos)
+        if m is None:
+            break
+        key, value, sep = m.groups()
+        first = value[0]
+        if first == 'b':
+            tag[key] = value[2:-1].encode('latin-1')
+        elif first == "'":
+            tag[key] = value[1:-1]
+        elif value in _CONSTANTS:
+            tag[key] = _CONSTANTS[value]
+        elif '.' in value or 'e' in value or 'E' in value:
+            tag[key] = float(value)
+        else:
+            tag[key] = int(value)
+        pos = m.end()
+        if sep == '}':
+            if pos == end:
+                return tag
+            break
+    return ast.literal_eval(text)
+
+class SawTagStream:
+    """Line-at-a-time parser for sllurp inventory output.
+
+    feed() each line as it is read from the process and it returns the tag
+    dicts completed on that line, so reads are available as soon as sllurp
+    prints them. Only the dict currently being assembled is buffered, so
+    memory stays flat however long the process runs. Each report is parsed
+    on its own; text outside "saw tag(s):" reports is ignored.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._pending: List[str] = []  # Pieces of a dict split over lines
+        self.reports = 0
+        self.errors = 0
+
+    def feed(self, line: str) -> List[Dict]:
+        start = line.find(SAW_TAGS)
+        if start != -1:
+            if self._depth:
+                self.errors += 1  # Previous report was cut off (e.g. process terminated)
+            self._depth = 0
+            self._pending = []
+            line = line[start + len(SAW_TAGS):]
+            self.reports += 1
+        elif not self._depth:
+            return []
+
+        tags = []
+        dict_start = 0 if self._pending else None
+        for m in _TOKENS.finditer(line):
+            token = m.group()
+            if token in '[{':
+                if token == '{' and self._depth == 1:
+                    dict_start = m.start()
+                self._depth += 1
+            elif token in ']}':
+                self._depth -= 1
+                if token == '}' and self._depth == 1 and dict_start is not None:
+                    text = ''.join(self._pending) + line[dict_start:m.end()]
+                    self._pending = []
+                    dict_start = None
+                    try:
+                        tags.append(decode_tag(text))
+                    except (SyntaxError, ValueError):
+                        self.errors += 1
+                elif self._depth <= 0:
+                    self._depth = 0  # End of this report
+                    break
+        if dict_start is not None and self._depth > 1:
+            self._pending.append(line[dict_start:])
+        return tags
+
+def parse_saw_tags(output: str) -> List[Dict]:
+    """Every tag dict in a block of captured sllurp output."""
+    stream = SawTagStream()
+    tags = []
+    for line in output.splitlines(keepends=True):
+        tags.extend(stream.feed(line))
+    return tags
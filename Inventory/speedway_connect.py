@@ -0,0 +1,170 @@
+import collections
+import csv
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from urllib.parse import unquote_plus, urlencode
+
+from epc import epc_bytes
+from tag_batch import TagReadBatch
+
+# Speedway Connect column names (includeAntennaPort / includePeakRssi /
+# includeFirstSeenTimestamp in the reader's configuration)
+EPC_FIELD = 'epc'
+ANTENNA_FIELD = 'antenna_port'
+RSSI_FIELD = 'peak_rssi'
+TIMESTAMP_FIELD = 'first_seen_timestamp'
+TID_FIELD = 'tid'
+
+# Speedway Connect socket output (socketServer=1): one tag read per line on socketPort
+SOCKET_PORT = 14150
+# Column order of each socket line; it has no header, so this must match the
+# fields enabled on the reader (SC-http-config.txt enables these)
+SOCKET_FIELDS = ('antenna_port', 'epc', 'first_seen_timestamp', 'peak_rssi', 'tid')
+MAX_SOCKET_LINE = 64 * 1024  # A partial line longer than this is discarded
+
+class ConnectPost(NamedTuple):
+    """One Speedway Connect FORM_URL_ENCODED report."""
+    reader_name: str
+    mac_address: str
+    field_names: List[str]
+    rows: List[List[str]]  # field_values, one list of unquoted values per tag read
+
+def parse_post(body: bytes) -> ConnectPost:
+    """Parse a Speedway Connect POST body in one pass.
+
+    Each form field is split out and percent-decoded once; field_values goes
+    straight through the csv module, which splits the lines and values and
+    strips the quotes in C. Raises ValueError if field_names is missing.
+    """
+    fields: Dict[str, str] = {}
+    for pair in body.split(b'&'):
+        key, sep, value = pair.partition(b'=')
+        if sep:
+            fields[unquote_plus(key.decode('latin-1'))] = unquote_plus(value.decode('latin-1'), 'utf-8')
+    if 'field_names' not in fields:
+        raise ValueError("POST has no field_names")
+    delimiter = fields.get('field_delim', ',').strip('"')
+    if len(delimiter) != 1:
+        delimiter = ','
+    field_names = [name.strip().strip('"') for name in fields['field_names'].split(delimiter)]
+    rows = [row for row in csv.reader(fields.get('field_values', '').splitlines(), delimiter=delimiter) if row]
+    return ConnectPost(fields.get('reader_name', '').strip('"'), fields.get('mac_address', '').strip('"'),
+                       field_names, rows)
+
+class SocketLineParser:
+    """Incremental parser for the Speedway Connect socket stream.
+
+    feed() each chunk as it is received and it returns the rows completed in
+    it, split and unquoted by the csv module; a line cut off at the end of
+    a chunk is kept until the rest arrives. Either line ending is accepted.
+    """
+
+    def __init__(self, delimiter: str = ','):
+        self.delimiter = delimiter
+        self.discarded = 0  # Overlong partial lines dropped
+        self._partial = b''
+
+    def feed(self, data: bytes) -> List[List[str]]:
+        data = self._partial + data
+        end = max(data.rfind(b'\n'), data.rfind(b'\r'))
+        if end < 0:
+            self._partial = data
+            if len(data) > MAX_SOCKET_LINE:
+                self._partial = b''
+                self.discarded += 1
+            return []
+        self._partial = data[end + 1:]
+        lines = data[:end].decode('latin-1').splitlines()
+        return [row for row in csv.reader(lines, delimiter=self.delimiter) if row]
+
+def _int_or_none(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+def post_batch(post: ConnectPost, received_us: int, reader_id: int = 0,
+               epc_prefix: Optional[str] = None) -> TagReadBatch:
+    """Pack a parsed POST into a TagReadBatch.
+
+    Reads without a first_seen_timestamp take `received_us`. With
+    `epc_prefix` set, EPCs that do not start with it are dropped (the reader
+    normally filters already, see epc.speedway_connect_filter()). The tid
+    field goes in the batch's tid column; the mac_address and any other
+    fields go in its extra column, so nothing the reader posts is lost.
+    """
+    column = {name: i for i, name in enumerate(post.field_names)}
+    if EPC_FIELD not in column:
+        raise ValueError(f"POST has no {EPC_FIELD} field: {post.field_names}")
+    i_epc = column[EPC_FIELD]
+    i_ts, i_ant, i_rssi, i_tid = (column.get(name)
+                                  for name in (TIMESTAMP_FIELD, ANTENNA_FIELD, RSSI_FIELD, TID_FIELD))
+    known = (EPC_FIELD, TIMESTAMP_FIELD, ANTENNA_FIELD, RSSI_FIELD, TID_FIELD)
+    other = [(name, i) for name, i in column.items() if name not in known]
+    fixed = [('mac_address', post.mac_address)] if post.mac_address else []
+    extra = urlencode(fixed, safe=':')  # The same for every row unless other fields were posted
+    width = len(post.field_names)
+    batch = TagReadBatch()
+    for row in post.rows:
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        epc = epc_bytes(row[i_epc]) if row[i_epc] else None
+        if epc is None or (epc_prefix and not epc.hex().startswith(epc_prefix)):
+            continue
+        batch.append(
+            (_int_or_none(row[i_ts]) if i_ts is not None else None) or received_us,
+            _int_or_none(row[i_ant]) if i_ant is not None else None,
+            _int_or_none(row[i_rssi]) if i_rssi is not None else None,
+            epc,
+            reader_id=reader_id,
+            tid=row[i_tid] if i_tid is not None else None,
+            extra=urlencode(fixed + [(name, row[i]) for name, i in other if row[i]], safe=':') if other else extra
+        )
+    return batch
+
+class ConsoleReporter:
+    """Prints one summary of the reads received every `interval` seconds.
+
+    Request handlers only call add(), which bumps a few counters, so their
+    cost does not depend on how much gets printed; the report itself (read
+    rate, POSTs, readers, reads per antenna in the interval and in total) is
+    printed by a background thread.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.totals = collections.Counter()  # Antenna -> reads for the whole run
+        self._lock = threading.Lock()
+        self._antennas = collections.Counter()
+        self._readers = set()
+        self._posts = 0
+        self._reads = 0
+        self._last = time.monotonic()
+
+    def add(self, reader_name: str, antennas: Sequence):
+        """Count one POST; `antennas` has one entry per read kept."""
+        with self._lock:
+            self._posts += 1
+            self._readers.add(reader_name)
+            self._antennas.update(antennas)
+            self._reads += len(antennas)
+
+    def start(self):
+        threading.Thread(target=self._run, name='console-reporter', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.report()
+
+    def report(self):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._last, 1e-6)
+            antennas, readers, posts, reads = self._antennas, self._readers, self._posts, self._reads
+            self._antennas, self._readers, self._posts, self._reads = collections.Counter(), set(), 0, 0
+            self._last = now
+            self.totals.update(antennas)
+            totals = dict(self.totals)
+        per_antenna = ', '.join(f"{antenna}: {antennas.get(antenna, 0)} ({totals[antenna]})"
+                                for antenna in sorted(totals, key=str))
+        print(f"{reads / elapsed:.0f} reads/s, {posts} POSTs from {len(readers)} reader(s) in {elapsed:.1f} s; "
+              f"reads per antenna (run total): {per_antenna or 'none'}")
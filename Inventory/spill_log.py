@@ -0,0 +1,50 @@
+import logging
+import os
+import time
+from typing import IO, List, Optional
+
+from tag_sink import DEFAULT_FSYNC_INTERVAL
+
+logger = logging.getLogger('spill_log')
+
+class SpillLog:
+    """Append-only text output spilled straight to disk as a series of segment files.
+
+    Writers put their data on `file` as it arrives instead of keeping the
+    run in memory, then call sync(): the file is flushed every time and
+    fsync'd at most every `fsync_interval` seconds, so a crash loses no more
+    than that. open_segment() finishes the current segment (fsync'd and
+    closed) and starts the next; `paths` lists them in order. Not
+    thread-safe on its own; callers serialize writes.
+    """
+
+    def __init__(self, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.fsync_interval = fsync_interval
+        self.paths: List[str] = []
+        self.file: Optional[IO[str]] = None
+        self._last_sync = time.monotonic()
+
+    def open_segment(self, path: str) -> IO[str]:
+        """Close the current segment and start writing `path`."""
+        self._close_file()
+        self.file = open(path, 'w', newline='')
+        self.paths.append(path)
+        logger.debug(f"Spilling to {path}")
+        return self.file
+
+    def sync(self):
+        """Flush what was written; fsync if `fsync_interval` has passed since the last one."""
+        self.file.flush()
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        self._close_file()
+
+    def _close_file(self):
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
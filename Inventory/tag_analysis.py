@@ -0,0 +1,114 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from tag_batch import TAG_READ_FIELDS
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:  # Only needed for parquet and arrow files
+    pa = pq = None
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # Only needed for zstd-compressed segments
+    zstandard = None
+
+# Loading and weighting captures written by the sinks in tag_sink, for the
+# model scripts; pandas is imported only when a capture is actually read.
+# This module does not import the sinks, so the extensions are listed here
+# (TagSink.extension of each format, tag_sink.COMPRESSION_SUFFIXES).
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.parquet': 'parquet', '.sqlite': 'sqlite', '.arrows': 'arrow'}
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+def _open_segment_file(path: str):
+    """Binary file object for a segment, decompressing .gz / .zst transparently."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst segments requires zstandard (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+def _read_file(path: str, fmt: str):
+    import pandas as pd  # type: ignore
+    if fmt == 'csv':
+        with _open_segment_file(path) as f:
+            return pd.read_csv(f, dtype={'epc': 'category'})
+    if fmt == 'sqlite':
+        if path.endswith(COMPRESSED_SUFFIXES):
+            # SQLite needs a real file to open
+            with _open_segment_file(path) as src, tempfile.NamedTemporaryFile(suffix='.sqlite') as tmp:
+                shutil.copyfileobj(src, tmp)
+                tmp.flush()
+                return _read_file(tmp.name, fmt)
+        with contextlib.closing(sqlite3.connect(path)) as conn:
+            return pd.read_sql_query('SELECT * FROM tag_reads', conn).astype({'epc': 'category'})
+    if pa is None:
+        raise RuntimeError(f"Reading {fmt} files requires pyarrow (pip install pyarrow)")
+    with _open_segment_file(path) as f:
+        if fmt == 'parquet':
+            return pq.read_table(io.BytesIO(f.read())).to_pandas()
+        return pa.ipc.open_stream(f).read_pandas()
+
+def _format_for_path(path: str) -> str:
+    base = path
+    for suffix in COMPRESSED_SUFFIXES:
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    fmt = FORMAT_EXTENSIONS.get(os.path.splitext(base)[1])
+    if fmt is None:
+        raise ValueError(f"Unrecognized tag read file: {path}")
+    return fmt
+
+def read_tags(path: str):
+    """Load a capture as one pandas DataFrame with a categorical epc column.
+
+    `path` may be a single output file (optionally .gz / .zst) or a
+    <stem>.manifest.json written by RotatingSink, in which case every listed
+    segment is read in order and concatenated.
+    """
+    import pandas as pd  # type: ignore
+    if not path.endswith('.manifest.json'):
+        return _read_file(path, _format_for_path(path))
+    with open(path) as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(path)
+    frames = [_read_file(os.path.join(directory, segment['path']), manifest['format'])
+              for segment in manifest['segments'] if segment['reads']]
+    if not frames:
+        return pd.DataFrame(columns=list(TAG_READ_FIELDS))
+    # Segments carry their own EPC dictionaries; re-categorize after concatenating
+    return pd.concat(frames, ignore_index=True).astype({'epc': 'category'})
+
+def seen_weights(df):
+    """Per-row sample weights: the seen_count column, or 1 for captures written before it existed."""
+    import pandas as pd  # type: ignore
+    if 'seen_count' in df.columns:
+        return df['seen_count'].fillna(1)
+    return pd.Series(1, index=df.index)
+
+def weighted_pivot(df, index, columns, values):
+    """pivot_table(aggfunc='mean') with each row weighted by its seen count.
+
+    One row with seen_count N counts like the N identical rows older
+    captures wrote, so results match those files without expanding them.
+    Missing values are skipped per column, as pivot_table does.
+    """
+    import pandas as pd  # type: ignore
+    weights = seen_weights(df)
+    keys = df[list(index) + [columns]]
+    means = {}
+    for value in values:
+        present = df[value].notna()
+        parts = keys.assign(_sum=df[value].where(present) * weights, _weight=weights.where(present))
+        sums = parts.pivot_table(index=index, columns=columns, values=['_sum', '_weight'], aggfunc='sum')
+        means[value] = sums['_sum'] / sums['_weight']
+    return pd.concat(means, axis=1)
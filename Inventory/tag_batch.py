@@ -0,0 +1,259 @@
+import datetime
+import threading
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from epc import epc_bytes
+
+# Column order used when a batch is written out row by row
+TAG_READ_FIELDS = ('timestamp_us', 'antenna', 'rssi', 'epc', 'phase_angle', 'channel_index', 'doppler_frequency',
+                   'reader', 'seen_count', 'tid', 'extra')
+
+# Per-read attributes of a TagReadBatch (every one is indexed by read)
+BATCH_COLUMNS = ('timestamp_us', 'antenna', 'rssi', 'phase_angle', 'channel_index', 'doppler_frequency',
+                 'epc_id', 'reader_id', 'seen_count', 'tid_id', 'extra')
+
+# Sentinels for values the reader did not report (typed arrays cannot hold None)
+MISSING_U16 = 0xFFFF
+MISSING_I16 = -0x8000
+
+def now_us() -> int:
+    """Current wall-clock time as integer microseconds since the epoch."""
+    return time.time_ns() // 1000
+
+def format_timestamp_us(timestamp_us: Optional[int]) -> str:
+    """ISO 8601 UTC string for a microsecond timestamp; for display only."""
+    if not timestamp_us:
+        return ''
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return (epoch + datetime.timedelta(microseconds=timestamp_us)).isoformat()
+
+class EPCTable:
+    """Interns EPCs to small integer ids so batches only carry an int per read.
+
+    Safe to call from several threads: lookups of known EPCs take no lock,
+    new ids are assigned under one.
+    """
+
+    def __init__(self):
+        self._ids: Dict[bytes, int] = {}
+        self.epcs: List[str] = []  # id -> EPC hex string
+        self._lock = threading.Lock()
+
+    def intern(self, epc: bytes) -> int:
+        """Return the id for raw EPC bytes, assigning a new one on first sight."""
+        epc_id = self._ids.get(epc)
+        if epc_id is None:
+            with self._lock:
+                epc_id = self._ids.get(epc)
+                if epc_id is None:
+                    # Append before publishing the id so epcs[epc_id] always resolves
+                    epc_id = len(self.epcs)
+                    self.epcs.append(epc.hex())
+                    self._ids[epc] = epc_id
+        return epc_id
+
+    def intern_text(self, epc: Union[str, bytes]) -> int:
+        """intern() for an EPC in any textual form canonical_epc() accepts."""
+        return self.intern(epc_bytes(epc))
+
+    def __len__(self) -> int:
+        return len(self.epcs)
+
+class StringTable:
+    """Interns strings such as reader names or TIDs; id 0 is '', i.e. unknown. Thread-safe like EPCTable."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {'': 0}
+        self.names: List[str] = ['']
+        self._lock = threading.Lock()
+
+    def intern(self, name: str) -> int:
+        reader_id = self._ids.get(name)
+        if reader_id is None:
+            with self._lock:
+                reader_id = self._ids.get(name)
+                if reader_id is None:
+                    reader_id = len(self.names)
+                    self.names.append(name)
+                    self._ids[name] = reader_id
+        return reader_id
+
+# Shared by every batch in the process so ids are stable for the whole run
+epc_table = EPCTable()
+reader_table = StringTable()  # "ip:port" or a configured reader ID
+tid_table = StringTable()     # TID hex, when the reader reports it
+
+class TagReadBatch:
+    """Column-oriented batch of tag reads, typically one RO_ACCESS_REPORT.
+
+    Each field is a typed array: int64 microsecond timestamp, uint16 antenna,
+    int16 RSSI, uint16 phase angle, uint16 channel index, int16 Doppler
+    frequency, uint32 EPC id into `epc_table`, uint16 reader id into
+    `reader_table`, uint32 seen count (the reader's TagSeenCount, i.e. how
+    many singulations one row stands for) and uint32 TID id into
+    `tid_table`. `extra` is a plain list holding any other fields a source
+    reported for the read (e.g. Speedway Connect's mac_address), URL-encoded
+    as "name=value&...", '' for none. The whole batch is moved across queues
+    as a single object.
+    """
+
+    __slots__ = BATCH_COLUMNS + ('epc_table',)
+
+    def __init__(self, table: Optional[EPCTable] = None):
+        self.timestamp_us = array('q')
+        self.antenna = array('H')
+        self.rssi = array('h')
+        self.phase_angle = array('H')
+        self.channel_index = array('H')
+        self.doppler_frequency = array('h')
+        self.epc_id = array('I')
+        self.reader_id = array('H')
+        self.seen_count = array('I')
+        self.tid_id = array('I')
+        self.extra: List[str] = []
+        self.epc_table = table if table is not None else epc_table
+
+    def __len__(self) -> int:
+        return len(self.epc_id)
+
+    def append(self, timestamp_us: Optional[int], antenna: Optional[int], rssi: Optional[int], epc: bytes,
+               phase_angle: Optional[int] = None, channel_index: Optional[int] = None,
+               doppler_frequency: Optional[int] = None, seen_count: Optional[int] = None, reader_id: int = 0,
+               tid: Optional[str] = None, extra: str = ''):
+        """Add one read; None values are stored as the missing-value sentinels (seen count defaults to 1)."""
+        self.timestamp_us.append(timestamp_us or 0)
+        self.antenna.append(MISSING_U16 if antenna is None else antenna)
+        self.rssi.append(MISSING_I16 if rssi is None else rssi)
+        self.phase_angle.append(MISSING_U16 if phase_angle is None else phase_angle)
+        self.channel_index.append(MISSING_U16 if channel_index is None else channel_index)
+        self.doppler_frequency.append(MISSING_I16 if doppler_frequency is None else doppler_frequency)
+        self.epc_id.append(self.epc_table.intern(epc))
+        self.reader_id.append(reader_id)
+        self.seen_count.append(seen_count or 1)
+        self.tid_id.append(tid_table.intern(tid.lower()) if tid else 0)
+        self.extra.append(extra)
+
+    def set_reader(self, reader_id: int):
+        """Attribute every read in the batch to one reader (see reader_table)."""
+        self.reader_id = array('H', [reader_id]) * len(self.epc_id)
+
+    def extend(self, other: 'TagReadBatch'):
+        """Append all reads from another batch sharing the same EPC table."""
+        self.timestamp_us.extend(other.timestamp_us)
+        self.antenna.extend(other.antenna)
+        self.rssi.extend(other.rssi)
+        self.phase_angle.extend(other.phase_angle)
+        self.channel_index.extend(other.channel_index)
+        self.doppler_frequency.extend(other.doppler_frequency)
+        self.epc_id.extend(other.epc_id)
+        self.reader_id.extend(other.reader_id)
+        self.seen_count.extend(other.seen_count)
+        self.tid_id.extend(other.tid_id)
+        self.extra.extend(other.extra)
+
+    def select(self, indices) -> 'TagReadBatch':
+        """New batch holding only the reads at `indices`, in that order."""
+        out = TagReadBatch(self.epc_table)
+        for name in BATCH_COLUMNS:
+            column = getattr(self, name)
+            getattr(out, name).extend(column[i] for i in indices)
+        return out
+
+    def coalesce(self) -> 'TagReadBatch':
+        """Keep only the most recent read per (reader, EPC, antenna), preserving arrival order.
+
+        The kept read's seen count absorbs the reads folded into it.
+        """
+        latest = {}
+        seen = {}
+        for i, (key, count) in enumerate(zip(zip(self.reader_id, self.epc_id, self.antenna), self.seen_count)):
+            latest[key] = i
+            seen[key] = seen.get(key, 0) + count
+        out = self.select(sorted(latest.values()))
+        out.seen_count = array('I', (min(seen[key], 0xFFFFFFFF)
+                                     for key in zip(out.reader_id, out.epc_id, out.antenna)))
+        return out
+
+    def fold(self, other: 'TagReadBatch', rows: Dict[Tuple[int, int, int], int]) -> int:
+        """Merge `other` in, keeping one row per (reader, EPC, antenna); returns how many rows were added.
+
+        `rows` maps each key to its row in this batch and is kept up to date.
+        A read whose key is already present overwrites that row in place
+        (seen counts add up), so rows stay in first-seen order; the cost is
+        proportional to len(other), not to the size of this batch.
+        """
+        added = 0
+        append = [(getattr(self, name).append, getattr(other, name)) for name in BATCH_COLUMNS]
+        # Key columns stay put; seen_count is summed separately
+        replace = [(getattr(self, name), getattr(other, name)) for name in BATCH_COLUMNS
+                   if name not in ('antenna', 'epc_id', 'reader_id', 'seen_count')]
+        seen_count, other_seen = self.seen_count, other.seen_count
+        for i, key in enumerate(zip(other.reader_id, other.epc_id, other.antenna)):
+            row = rows.get(key)
+            if row is None:
+                rows[key] = len(seen_count)
+                for add, column in append:
+                    add(column[i])
+                added += 1
+                continue
+            for target, column in replace:
+                target[row] = column[i]
+            seen_count[row] = min(seen_count[row] + other_seen[i], 0xFFFFFFFF)
+        return added
+
+    def rows(self) -> Iterator[Tuple]:
+        """Yield rows in TAG_READ_FIELDS order with None for missing values."""
+        epcs = self.epc_table.epcs
+        readers = reader_table.names
+        tids = tid_table.names
+        for ts, ant, rssi, epc_id, phase, channel, doppler, reader_id, seen, tid_id, extra in zip(
+                self.timestamp_us, self.antenna, self.rssi, self.epc_id, self.phase_angle, self.channel_index,
+                self.doppler_frequency, self.reader_id, self.seen_count, self.tid_id, self.extra):
+            yield (
+                ts or None,
+                None if ant == MISSING_U16 else ant,
+                None if rssi == MISSING_I16 else rssi,
+                epcs[epc_id],
+                None if phase == MISSING_U16 else phase,
+                None if channel == MISSING_U16 else channel,
+                None if doppler == MISSING_I16 else doppler,
+                readers[reader_id] or None,
+                seen,
+                tids[tid_id] or None,
+                extra or None,
+            )
+
+    def columns(self, epc_ids: bool = False) -> Dict[str, List]:
+        """Field name -> list of values (None for missing), in TAG_READ_FIELDS order.
+
+        With `epc_ids` the epc column holds ids into `epc_table` instead of
+        hex strings, for sinks that store the EPC dictionary separately.
+        """
+        def u16(column):
+            return [None if v == MISSING_U16 else v for v in column]
+
+        def i16(column):
+            return [None if v == MISSING_I16 else v for v in column]
+
+        epcs = self.epc_table.epcs
+        readers = reader_table.names
+        tids = tid_table.names
+        return {
+            'timestamp_us': [ts or None for ts in self.timestamp_us],
+            'antenna': u16(self.antenna),
+            'rssi': i16(self.rssi),
+            'epc': list(self.epc_id) if epc_ids else [epcs[i] for i in self.epc_id],
+            'phase_angle': u16(self.phase_angle),
+            'channel_index': u16(self.channel_index),
+            'doppler_frequency': i16(self.doppler_frequency),
+            'reader': [readers[i] or None for i in self.reader_id],
+            'seen_count': list(self.seen_count),
+            'tid': [tids[i] or None for i in self.tid_id],
+            'extra': [extra or None for extra in self.extra],
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """Expand to one dict per read (for logging and ad-hoc use, not the hot path)."""
+        return [dict(zip(TAG_READ_FIELDS, row)) for row in self.rows()]
@@ -0,0 +1,413 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dedup import DedupWindow
+from tag_batch import TAG_READ_FIELDS, TagReadBatch
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:  # Only needed for the parquet and arrow formats
+    pa = pq = None
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # Only needed for zstd-compressed segments
+    zstandard = None
+
+logger = logging.getLogger('tag_sink')
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+DEFAULT_FSYNC_INTERVAL = 1.0  # Seconds between fsyncs of a CSV sink
+
+class TagSink:
+    """Destination for batches of tag reads; subclasses implement one file format."""
+
+    extension = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+
+    def write(self, batch: TagReadBatch):
+        """Append a batch. Implementations should make it durable cheaply (flush, commit)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CSVSink(TagSink):
+    """Plain CSV with a TAG_READ_FIELDS header; EPCs stay hex text so any CSV tool can read it.
+
+    Every write is flushed to the OS; the file is fsync'd at most every
+    `fsync_interval` seconds, so a crash or power cut loses at most that much.
+    """
+
+    extension = '.csv'
+
+    def __init__(self, path: str, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        super().__init__(path)
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(TAG_READ_FIELDS)
+        self._last_sync = time.monotonic()
+
+    def write(self, batch: TagReadBatch):
+        self._writer.writerows(batch.rows())
+        self._file.flush()
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+        self.written += len(batch)
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+class SQLiteSink(TagSink):
+    """SQLite database in WAL mode: an epcs dictionary table plus integer-keyed reads.
+
+    Reads are stored with an epc_id into `epcs`; the tag_reads view joins the
+    EPC text back in, so queries against tag_reads see the usual columns.
+    """
+
+    extension = '.sqlite'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # The writer thread is usually not the thread that opened the sink
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS epcs (epc_id INTEGER PRIMARY KEY, epc TEXT NOT NULL)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS reads (timestamp_us INTEGER, antenna INTEGER, rssi INTEGER, '
+            'epc_id INTEGER, phase_angle INTEGER, channel_index INTEGER, doppler_frequency INTEGER, reader TEXT, '
+            'seen_count INTEGER, tid TEXT, extra TEXT)'
+        )
+        self._conn.execute(
+            'CREATE VIEW IF NOT EXISTS tag_reads AS SELECT timestamp_us, antenna, rssi, epc, phase_angle, '
+            'channel_index, doppler_frequency, reader, seen_count, tid, extra FROM reads JOIN epcs USING (epc_id)'
+        )
+        self._insert = f"INSERT INTO reads VALUES ({', '.join('?' * len(TAG_READ_FIELDS))})"
+        self._epcs_written = 0
+
+    def write(self, batch: TagReadBatch):
+        epcs = batch.epc_table.epcs
+        with self._conn:  # One transaction per batch, dictionary entries included
+            if len(epcs) > self._epcs_written:
+                self._conn.executemany('INSERT INTO epcs VALUES (?, ?)',
+                                       enumerate(epcs[self._epcs_written:], self._epcs_written))
+                self._epcs_written = len(epcs)
+            self._conn.executemany(self._insert, zip(*batch.columns(epc_ids=True).values()))
+        self.written += len(batch)
+
+    def close(self):
+        self._conn.close()
+
+def _arrow_schema():
+    return pa.schema([
+        ('timestamp_us', pa.int64()),
+        ('antenna', pa.uint16()),
+        ('rssi', pa.int16()),
+        ('epc', pa.dictionary(pa.int32(), pa.string())),
+        ('phase_angle', pa.uint16()),
+        ('channel_index', pa.uint16()),
+        ('doppler_frequency', pa.int16()),
+        ('reader', pa.string()),
+        ('seen_count', pa.uint32()),
+        ('tid', pa.string()),
+        ('extra', pa.string()),
+    ])
+
+class _ArrowEPCDictionary:
+    """Grows an Arrow string array alongside the EPC table so batches encode as dictionary ids."""
+
+    def __init__(self):
+        self._values = pa.array([], pa.string())
+
+    def encode(self, batch: TagReadBatch):
+        epcs = batch.epc_table.epcs
+        if len(epcs) > len(self._values):
+            self._values = pa.concat_arrays([self._values, pa.array(epcs[len(self._values):], pa.string())])
+        return pa.DictionaryArray.from_arrays(pa.array(batch.epc_id, pa.int32()), self._values)
+
+def _record_batch(batch: TagReadBatch, schema, dictionary: _ArrowEPCDictionary):
+    columns = batch.columns(epc_ids=True)
+    arrays = [dictionary.encode(batch) if field.name == 'epc' else pa.array(columns[field.name], field.type)
+              for field in schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _require_pyarrow(fmt: str):
+    if pa is None:
+        raise RuntimeError(f"{fmt} output requires pyarrow (pip install pyarrow)")
+
+class ParquetSink(TagSink):
+    """Columnar Parquet file, one row group per `row_group_size` reads, EPCs dictionary-encoded."""
+
+    extension = '.parquet'
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        _require_pyarrow('Parquet')
+        super().__init__(path)
+        self.row_group_size = row_group_size
+        self._schema = _arrow_schema()
+        self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+        self._dictionary = _ArrowEPCDictionary()
+        self._pending = TagReadBatch()
+
+    def write(self, batch: TagReadBatch):
+        self._pending.extend(batch)
+        if len(self._pending) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        table = pa.Table.from_batches([_record_batch(self._pending, self._schema, self._dictionary)])
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self.written += len(self._pending)
+        self._pending = TagReadBatch()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+class ArrowSink(TagSink):
+    """Arrow IPC stream, one record batch per write; new EPCs go out as dictionary deltas."""
+
+    extension = '.arrows'
+
+    def __init__(self, path: str):
+        _require_pyarrow('Arrow IPC')
+        super().__init__(path)
+        self._schema = _arrow_schema()
+        self._sink = pa.OSFile(path, 'wb')
+        self._writer = pa.ipc.new_stream(self._sink, self._schema,
+                                         options=pa.ipc.IpcWriteOptions(compression='zstd',
+                                                                        emit_dictionary_deltas=True))
+        self._dictionary = _ArrowEPCDictionary()
+
+    def write(self, batch: TagReadBatch):
+        if not batch:
+            return
+        self._writer.write_batch(_record_batch(batch, self._schema, self._dictionary))
+        self._sink.flush()
+        self.written += len(batch)
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+SINK_FORMATS: Dict[str, type] = {
+    'csv': CSVSink,
+    'parquet': ParquetSink,
+    'sqlite': SQLiteSink,
+    'arrow': ArrowSink,
+}
+
+def _make_sink(sink_class: type, path: str, row_group_size: int) -> TagSink:
+    if sink_class is ParquetSink:
+        return sink_class(path, row_group_size)
+    return sink_class(path)
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+def _compress_file(path: str, compression: str) -> str:
+    """Compress `path` next to itself, remove the original and return the new path."""
+    target = path + COMPRESSION_SUFFIXES[compression]
+    with open(path, 'rb') as src:
+        if compression == 'gzip':
+            with gzip.open(target, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+        else:
+            with open(target, 'wb') as raw, zstandard.ZstdCompressor(level=10).stream_writer(raw) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+    os.remove(path)
+    return target
+
+class RotatingSink(TagSink):
+    """Split output into numbered segments by size or wall-clock interval.
+
+    Segments are named <stem>.0000<ext>, <stem>.0001<ext>, ... Closed segments
+    are compressed by a background thread when `compression` is set, and
+    <stem>.manifest.json lists every segment in order so the set can be read
+    back as one dataset with tag_analysis.read_tags().
+    """
+
+    def __init__(self, fmt: str, stem: str, max_bytes: Optional[int] = None,
+                 max_seconds: Optional[float] = None, compression: Optional[str] = None,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd compression requires zstandard (pip install zstandard)")
+        self.fmt = fmt
+        self.stem = stem
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.manifest_path = stem + '.manifest.json'
+        self._segments: List[Dict] = []
+        self._lock = threading.Lock()  # Guards the segment list / manifest
+        self._compress_queue = queue.Queue()
+        self._compressor = None
+        if compression:
+            self._compressor = threading.Thread(target=self._compress_worker, name='segment-compressor', daemon=True)
+            self._compressor.start()
+        self._open_segment()
+        super().__init__(self._sink.path)
+
+    def write(self, batch: TagReadBatch):
+        if not batch:
+            return
+        if self._segment['reads'] and self._should_rotate():
+            self.rotate()
+        self._sink.write(batch)
+        segment = self._segment
+        first, last = min(batch.timestamp_us), max(batch.timestamp_us)
+        segment['reads'] += len(batch)
+        if segment['first_timestamp_us'] is None or first < segment['first_timestamp_us']:
+            segment['first_timestamp_us'] = first
+        if segment['last_timestamp_us'] is None or last > segment['last_timestamp_us']:
+            segment['last_timestamp_us'] = last
+        self.written += len(batch)
+
+    def rotate(self):
+        """Close the current segment and start the next one."""
+        self._close_segment()
+        self._open_segment()
+        self.path = self._sink.path
+
+    def close(self):
+        self._close_segment()
+        if self._compressor:
+            self._compress_queue.put(None)
+            self._compressor.join()
+
+    def _should_rotate(self) -> bool:
+        if self.max_seconds and time.time() - self._segment_opened >= self.max_seconds:
+            return True
+        return bool(self.max_bytes) and os.path.getsize(self._sink.path) >= self.max_bytes
+
+    def _open_segment(self):
+        sink_class = SINK_FORMATS[self.fmt]
+        path = f"{self.stem}.{len(self._segments):04d}{sink_class.extension}"
+        self._sink = _make_sink(sink_class, path, self.row_group_size)
+        self._segment_opened = time.time()
+        self._segment = {'path': os.path.basename(path), 'reads': 0, 'first_timestamp_us': None,
+                         'last_timestamp_us': None, 'compression': None, 'closed': False}
+        with self._lock:
+            self._segments.append(self._segment)
+            self._write_manifest()
+        logger.info(f"Opened segment {path}")
+
+    def _close_segment(self):
+        self._sink.close()
+        with self._lock:
+            self._segment['closed'] = True
+            self._segment['bytes'] = os.path.getsize(self._sink.path)
+            self._write_manifest()
+        if self._compressor:
+            self._compress_queue.put((self._segment, self._sink.path))
+
+    def _compress_worker(self):
+        while True:
+            item = self._compress_queue.get()
+            if item is None:
+                break
+            segment, path = item
+            try:
+                target = _compress_file(path, self.compression)
+            except OSError as e:
+                logger.error(f"Failed to compress {path}: {e}")
+                continue
+            with self._lock:
+                segment['path'] = os.path.basename(target)
+                segment['compression'] = self.compression
+                segment['bytes'] = os.path.getsize(target)
+                self._write_manifest()
+            logger.info(f"Compressed {path} -> {target}")
+
+    def _write_manifest(self):
+        """Atomically replace the manifest (caller holds the lock)."""
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'format': self.fmt, 'segments': self._segments}, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+class DedupSink(TagSink):
+    """Drops repeat reads within a DedupWindow before they reach the wrapped sink."""
+
+    def __init__(self, sink: TagSink, window_s: float):
+        self.sink = sink
+        self.window = DedupWindow(window_s)
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)  # path, written, manifest_path, ... of the real sink
+
+    def write(self, batch: TagReadBatch):
+        batch = self.window.filter(batch)
+        if batch:
+            self.sink.write(batch)
+
+    def close(self):
+        self.sink.close()
+        logger.info(f"Dedup window {self.window.window_us / 1e6:g} s: kept {self.window.passed} reads, "
+                    f"suppressed {self.window.suppressed}")
+
+def add_sink_arguments(parser):
+    """Add output format, rotation and compression options to an argparse parser."""
+    parser.add_argument('--format', choices=sorted(SINK_FORMATS), default='csv', help='Output file format')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help='Reads per Parquet row group')
+    parser.add_argument('--rotate-mb', type=float, help='Start a new output segment after this many MiB')
+    parser.add_argument('--rotate-seconds', type=float, help='Start a new output segment after this many seconds')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES),
+                        help='Compress closed segments in the background')
+    parser.add_argument('--dedup-window', type=float, default=0, metavar='SECONDS',
+                        help='Drop repeat reads of a tag on the same antenna within this many seconds, '
+                             'like Speedway Connect\'s softwareFilterWindowSec (0 = keep every read)')
+
+def open_sink(fmt: str, stem: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+              rotate_mb: Optional[float] = None, rotate_seconds: Optional[float] = None,
+              compress: Optional[str] = None, dedup_window: float = 0) -> TagSink:
+    """Open a sink of the given format at `stem` plus the format's extension.
+
+    Any rotation or compression option switches to a RotatingSink, which
+    writes numbered segments plus a manifest instead of a single file. A
+    positive `dedup_window` (seconds) wraps the result in a DedupSink.
+    """
+    if rotate_mb or rotate_seconds or compress:
+        max_bytes = int(rotate_mb * 1024 * 1024) if rotate_mb else None
+        sink = RotatingSink(fmt, stem, max_bytes, rotate_seconds, compress, row_group_size)
+        logger.info(f"Writing {fmt} segments listed in {sink.manifest_path}")
+    else:
+        sink_class = SINK_FORMATS[fmt]
+        sink = _make_sink(sink_class, stem + sink_class.extension, row_group_size)
+        logger.info(f"Writing {fmt} output to {sink.path}")
+    if dedup_window > 0:
+        sink = DedupSink(sink, dedup_window)
+        logger.info(f"Suppressing repeat reads within {dedup_window:g} s per tag and antenna")
+    return sink
+
+def open_sink_from_args(args, stem: str) -> TagSink:
+    """open_sink() with the options added by add_sink_arguments()."""
+    return open_sink(args.format, stem, args.row_group_size, args.rotate_mb, args.rotate_seconds, args.compress,
+                     args.dedup_window)
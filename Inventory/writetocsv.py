@@ -1,6 +1,5 @@
 from flask import Flask, request # type: ignore
-import urllib.parse
-import csv
+import argparse
 from datetime import datetime
 import threading
 import time
@@ -8,100 +7,79 @@ import os
 import signal
 import sys
 
+from epc import epc_mask, speedway_connect_filter
+from speedway_connect import ConsoleReporter, parse_post, post_batch
+from tag_batch import now_us, reader_table
+from tag_sink import add_sink_arguments, open_sink_from_args
+
 app = Flask(__name__)
 
-# Global list to store all tag reads during the run
-all_tag_reads = []
+# Output sink, opened at startup; reads are written as each POST arrives
+sink = None
+sink_lock = threading.Lock()  # Flask may handle POSTs on several threads
+epc_filter = None  # Hex EPC prefix; the reader applies it, see speedway_connect_filter()
+filter_misses = 0
+reporter = ConsoleReporter()
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C to save data before exiting."""
-    print("\nInterrupted! Saving data to CSV...")
-    write_csv(epc_filter)
+    print("\nInterrupted! Closing output...")
+    close_output()
     sys.exit(0)
 
 @app.route('/rfid', methods=['POST'])
 def receive_data():
-    # Get raw data as text
-    raw_data = request.get_data(as_text=True)
-    
-    # Parse URL-encoded data into a dictionary
-    parsed_data = urllib.parse.parse_qs(raw_data)
-    
-    # Extract reader metadata, stripping quotes
-    reader_name = parsed_data.get('reader_name', [''])[0].strip('"')
-    mac_address = parsed_data.get('mac_address', [''])[0].strip('"')
-    
-    # Extract field names and values
-    field_names = parsed_data.get('field_names', [''])[0].split(',')
-    field_values = parsed_data.get('field_values', [''])[0].split('\n')
-    
-    # Process each tag read
-    for value_line in field_values:
-        if value_line.strip():  # Skip empty lines
-            values = [v.strip('"') for v in value_line.split(',')]  # Strip quotes from each value
-            tag_read = dict(zip(field_names, values))
-            # Add reader metadata and timestamp to the tag read
-            tag_read['reader_name'] = reader_name
-            tag_read['mac_address'] = mac_address
-            tag_read['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            all_tag_reads.append(tag_read)
-    
-    # Print parsed data to console
-    print(f"Reader: {reader_name}, MAC: {mac_address}")
-    for value_line in field_values:
-        if value_line.strip():
-            values = [v.strip('"') for v in value_line.split(',')]
-            tag_read = dict(zip(field_names, values))
-            print(f"Tag Read: {tag_read}")
+    global filter_misses
+    # One pass over the URL-encoded body; one receive timestamp (integer µs) per POST
+    received_us = now_us()
+    try:
+        post = parse_post(request.get_data())
+        reader_name = post.reader_name or post.mac_address
+        batch = post_batch(post, received_us, reader_table.intern(reader_name), epc_filter)
+    except ValueError as e:
+        # Missing epc field, non-numeric antenna/RSSI or a malformed EPC
+        print(f"Rejected POST: {e}")
+        return str(e), 400
+    if epc_filter and len(batch) < len(post.rows):
+        # Only happens when the reader's C1G2 filter was not set up
+        if not filter_misses:
+            print("Reads outside the EPC filter are arriving; apply the Speedway Connect filter settings")
+        filter_misses += len(post.rows) - len(batch)
+    if batch:
+        with sink_lock:
+            sink.write(batch)
+    
+    # Counted here, printed by the reporter thread every --report-interval seconds
+    reporter.add(reader_name, batch.antenna)
     
     return "OK", 200
 
-def write_csv(epc_filter=None):
-    if not all_tag_reads:
-        print("No tag reads collected, skipping CSV creation.")
-        return
-    
-    # Filter tag reads by EPC if a filter is provided
-    filtered_reads = all_tag_reads
-    if epc_filter:
-        epc_filter = epc_filter.lower()
-        filtered_reads = [
-            read for read in all_tag_reads
-            if 'epc' in read and epc_filter in read['epc'].lower()
-        ]
-    
-    if not filtered_reads:
-        print("No tag reads match the EPC filter, skipping CSV creation.")
-        return
-    
-    # Generate single CSV file with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_filename = f"rfid_data_{timestamp}.csv"
-    
-    # Get all possible field names from filtered data
-    field_names = set()
-    for read in filtered_reads:
-        field_names.update(read.keys())
-    field_names = sorted(field_names)  # Sort for consistent column order
-    
-    # Write to CSV
-    with open(csv_filename, mode='w', newline='') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=field_names)
-        writer.writeheader()
-        for read in filtered_reads:
-            writer.writerow(read)
-    
-    print(f"Data written to {csv_filename}")
+def close_output():
+    """Close the output sink (finishing the last segment) and report where it went."""
+    reporter.report()
+    with sink_lock:
+        sink.close()
+    if sink.written:
+        print(f"Wrote {sink.written} tag reads to {getattr(sink, 'manifest_path', sink.path)}")
+    else:
+        print("No tag reads collected.")
 
-def shutdown_server(duration, epc_filter):
+def shutdown_server(duration):
     """Stop the Flask server after the specified duration (in seconds)."""
     time.sleep(duration)
     print(f"Run duration of {duration} seconds completed. Stopping server...")
-    write_csv(epc_filter)
+    close_output()
     # Graceful shutdown
     os._exit(0)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Speedway Connect HTTP POST receiver")
+    parser.add_argument('--report-interval', type=float, default=5.0,
+                        help='Seconds between console summaries of read rate and reads per antenna')
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+    reporter.interval = args.report_interval
+
     # Register Ctrl+C handler
     signal.signal(signal.SIGINT, signal_handler)
     
@@ -119,14 +97,29 @@ if __name__ == '__main__':
         except ValueError:
             print("Please enter a valid number or leave blank.")
     
-    # Prompt user for EPC filter
-    epc_filter = input("Enter EPC filter (leave blank for no filter): ").strip()
-    if not epc_filter:
-        epc_filter = None
+    # Prompt user for EPC filter; the reader does the filtering, so show the settings it needs
+    while True:
+        epc_filter = input("Enter EPC or EPC prefix filter (hex, leave blank for no filter): ").strip() or None
+        if not epc_filter:
+            break
+        try:
+            bit_count, mask = epc_mask(epc_filter)
+        except ValueError:
+            print("Please enter a hex EPC or prefix, or leave blank.")
+            continue
+        epc_filter = mask.hex()[:bit_count // 4]
+        print("Set these in the Speedway Connect configuration so the reader only reports matching tags:")
+        print(speedway_connect_filter(epc_filter))
+        break
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    sink = open_sink_from_args(args, f"rfid_data_{timestamp}")
     
     # Start the shutdown timer only if a duration was provided
     if run_duration is not None:
-        threading.Thread(target=shutdown_server, args=(run_duration, epc_filter), daemon=True).start()
+        threading.Thread(target=shutdown_server, args=(run_duration,), daemon=True).start()
+    
+    reporter.start()
     
     # Run the Flask app
     app.run(host="0.0.0.0", port=5050)
\ No newline at end of file
@@ -172,7 +172,10 @@ for file in all_files:
     print(f"Processing file: {filename}, meta_key: {meta_key}")
 
     df = pd.read_csv(file)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+    if 'timestamp_us' in df.columns:  # Newer captures store integer microseconds
+        df['timestamp'] = pd.to_datetime(df['timestamp_us'], unit='us')
+    else:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
     df['test_id'] = filename
 
     meta = readme_data[readme_data['raw_CSV_filename'] == meta_key]
@@ -391,8 +394,11 @@ for test_file in test_files:
     print(f"\nPredicting for {filename}, Radius {radius}")
 
     df = pd.read_csv(file_path)
+    if 'timestamp_us' in df.columns:  # Newer captures store integer microseconds
+        df['timestamp'] = pd.to_datetime(df['timestamp_us'], unit='us')
+    else:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
     df = df.sort_values('timestamp')
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
     df['test_id'] = filename
 
     print(f"Test data shape for {filename}:", df.shape)
@@ -10,6 +10,10 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, accuracy_sc
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Inventory'))
+from tag_analysis import seen_weights, weighted_pivot
 warnings.filterwarnings('ignore')
 
 # Function to assign quadrant
@@ -77,7 +81,7 @@ for _, row in metadata.iterrows():
     print(f"  Columns: {list(df.columns)}")
     unique_antennas = df['antenna'].unique()
     print(f"  Unique antennas: {unique_antennas}")
-    antenna_counts = df['antenna'].value_counts()
+    antenna_counts = seen_weights(df).groupby(df['antenna']).sum()  # Reads, counting TagSeenCount
     print(f"  Antenna counts:\n{antenna_counts}\n")
     # Filter imbalanced tests
     if any(antenna_counts.get(ant, 0) < 15 for ant in [1, 2, 3, 4]):
@@ -108,20 +112,15 @@ if dynamic_data.empty:
     print("No dynamic data loaded.")
     exit(1)
 
-# Aggregate datasets
-stationary_pivot = stationary_data.groupby(['test_id', 'x_coord', 'y_coord', 'antenna']).agg({
-    'rssi': 'mean',
-    'phase_angle': 'mean'
-}).unstack()
+# Aggregate datasets (means weighted by each row's seen_count)
+stationary_pivot = weighted_pivot(stationary_data, ['test_id', 'x_coord', 'y_coord'], 'antenna',
+                                  ['rssi', 'phase_angle'])
 stationary_pivot.columns = [f'{col[0]}_Ant{int(col[1])}' for col in stationary_pivot.columns]
 stationary_pivot = stationary_pivot.reset_index()
 print(f"Stationary pivot rows: {len(stationary_pivot)}")
 
-dynamic_pivot = dynamic_data.groupby(['test_id', 'x_coord', 'y_coord', 'antenna']).agg({
-    'rssi': 'mean',
-    'phase_angle': 'mean',
-    'sample_weight': 'mean'
-}).unstack()
+dynamic_pivot = weighted_pivot(dynamic_data, ['test_id', 'x_coord', 'y_coord'], 'antenna',
+                               ['rssi', 'phase_angle', 'sample_weight'])
 dynamic_pivot.columns = [f'{col[0]}_Ant{int(col[1])}' if col[0] != 'sample_weight' else f'sample_weight_Ant{int(col[1])}' for col in dynamic_pivot.columns]
 dynamic_pivot = dynamic_pivot.reset_index()
 print(f"Dynamic pivot rows: {len(dynamic_pivot)}")
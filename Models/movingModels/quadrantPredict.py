@@ -8,6 +8,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import joblib
 import os
+import sys
+
+# Shared capture readers live with the capture tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Inventory'))
+from tag_analysis import read_tags, weighted_pivot
 
 # Define quadrant mapping function
 def coordinates_to_quadrant(x, y):
@@ -40,19 +45,19 @@ def load_and_preprocess_data(metadata_file, data_dir, is_static=False):
     
     for _, row in metadata.iterrows():
         file_path = os.path.join(data_dir, f"{row['raw_CSV_filename']}.csv")
-        if not os.path.exists(file_path):
+        manifest_path = os.path.join(data_dir, f"{row['raw_CSV_filename']}.manifest.json")
+        if os.path.exists(manifest_path):  # Rotated capture: all segments as one dataset
+            df = read_tags(manifest_path)
+        elif os.path.exists(file_path):
+            df = pd.read_csv(file_path)
+        else:
             print(f"Warning: File {file_path} not found, skipping.")
             continue
-        
-        df = pd.read_csv(file_path)
+        if 'timestamp_us' in df.columns:  # Newer captures store integer microseconds
+            df['timestamp'] = (df['timestamp_us'] // 1000) / 1000
         # Pivot data to get one row per timestamp
         df['timestamp'] = df['timestamp'].round(3)  # Round to handle floating-point precision
-        pivoted = df.pivot_table(
-            index='timestamp',
-            columns='antenna',
-            values=['rssi', 'phase_angle'],
-            aggfunc='mean'
-        )
+        pivoted = weighted_pivot(df, ['timestamp'], 'antenna', ['rssi', 'phase_angle'])
         pivoted.columns = [f'{col[0]}_{col[1]}' for col in pivoted.columns]
         pivoted = pivoted.reset_index()
         
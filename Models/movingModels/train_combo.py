@@ -9,6 +9,10 @@ from scipy.optimize import least_squares
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Inventory'))
+from tag_analysis import weighted_pivot
 warnings.filterwarnings('ignore')
 
 def get_quadrant(x, y):
@@ -132,28 +136,28 @@ if dynamic_linear_data.empty and dynamic_circular_data.empty:
     print("No dynamic data loaded.")
     exit(1)
 
-# Pivot datasets
-stationary_pivot = stationary_data.pivot_table(
+# Pivot datasets (means weighted by each row's seen_count)
+stationary_pivot = weighted_pivot(
+    stationary_data,
     index=['test_id', 'x_coord', 'y_coord', 'quadrant'],
     columns='antenna',
-    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight'],
-    aggfunc='mean'
+    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight']
 ).reset_index()
 stationary_pivot.columns = [f'{col[0]}_Ant{int(col[1])}' if isinstance(col, tuple) and col[1] else col[0] for col in stationary_pivot.columns]
 
-dynamic_linear_pivot = dynamic_linear_data.pivot_table(
+dynamic_linear_pivot = weighted_pivot(
+    dynamic_linear_data,
     index=['test_id', 'x_coord', 'y_coord', 'quadrant'],
     columns='antenna',
-    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight'],
-    aggfunc='mean'
+    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight']
 ).reset_index()
 dynamic_linear_pivot.columns = [f'{col[0]}_Ant{int(col[1])}' if isinstance(col, tuple) and col[1] else col[0] for col in dynamic_linear_pivot.columns]
 
-dynamic_circular_pivot = dynamic_circular_data.pivot_table(
+dynamic_circular_pivot = weighted_pivot(
+    dynamic_circular_data,
     index=['test_id', 'x_coord', 'y_coord', 'quadrant'],
     columns='antenna',
-    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight'],
-    aggfunc='mean'
+    values=['rssi', 'phase_angle', 'doppler_frequency', 'channel_index', 'sample_weight']
 ).reset_index()
 dynamic_circular_pivot.columns = [f'{col[0]}_Ant{int(col[1])}' if isinstance(col, tuple) and col[1] else col[0] for col in dynamic_circular_pivot.columns]
 